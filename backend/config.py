@@ -8,3 +8,11 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 BUCKET_NAME = os.getenv("SUPABASE_BUCKET", "residentes_videos")
 SUPABASE_KEY_SERVICE_ROLE = os.getenv("SUPABASE_KEY_SERVICE_ROLE")
 MICROSERVICIO_URL = os.getenv("MICROSERVICIO_URL")
+
+# Consultas a Supabase simultáneas (hilos dedicados, ver services/repository.py)
+DB_CONCURRENCY = int(os.getenv("DB_CONCURRENCY", "20"))            # lecturas puntuales y escrituras
+DB_BULK_CONCURRENCY = int(os.getenv("DB_BULK_CONCURRENCY", "10"))  # listados completos y subidas
+
+# Caché de lecturas de residentes (ver services/db_services.py)
+RESIDENTES_CACHE_TTL = float(os.getenv("RESIDENTES_CACHE_TTL", "60"))       # segundos
+RESIDENTES_CACHE_SIZE = int(os.getenv("RESIDENTES_CACHE_SIZE", "256"))      # entradas
@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from routes.residentes import router as residentes_router
 from routes.accesos import router as accesos_router
 from fastapi.middleware.cors import CORSMiddleware
+from services.db_services import get_residentes_cache_stats
 
 app = FastAPI()
 
@@ -28,3 +29,9 @@ app.include_router(accesos_router)
 @app.get("/")
 def root():
     return {"message": "Backend running"}
+
+
+# Aciertos / fallos de la caché de residentes
+@app.get("/metrics")
+def metrics():
+    return {"residentes_cache": get_residentes_cache_stats()}
@@ -1,9 +1,30 @@
-from fastapi import APIRouter
-from services.db_services import get_all_accesos
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from services import repository
+from services.db_services import ACCESOS_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(prefix="/accesos")
 
 @router.get("/")
-def get_accesos():
-    data = get_all_accesos()
-    return {"status": "ok", "data": data}
+async def get_accesos(
+    limit: int = Query(ACCESOS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,          # next_cursor de la página anterior
+    fields: Optional[str] = None,          # ej: "tipo,fecha,hora,nombre_residente"
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    residente_id: Optional[int] = None,
+    tipo: Optional[str] = None,
+    q: Optional[str] = None,               # búsqueda por nombre del residente
+    conocido: Optional[bool] = None,       # True: con residente, False: desconocidos
+):
+    try:
+        data, next_cursor = await repository.get_accesos_page(
+            limit=limit, cursor=cursor, fields=fields,
+            desde=desde, hasta=hasta, residente_id=residente_id, tipo=tipo,
+            q=q, conocido=conocido,
+        )
+    except ValueError as e:
+        return {"status": "error", "msg": str(e)}
+    return {"status": "ok", "data": data, "next_cursor": next_cursor}
@@ -1,17 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import requests
-
-from services.supabase_service import upload_video_to_supabase
-from services.db_services import (
-    insert_residente,
-    get_all_residentes,
-    get_residente_by_id,
-    update_residente_db,
-    delete_residente_db,
-    get_training_candidates_db,
-    call_microservice_generate_dataset
-)
+from typing import Optional
+import asyncio
+import json
+
+from services import repository
+from services.db_services import generate_datasets, RESIDENTES_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(prefix="/residentes")
 
@@ -39,58 +34,85 @@ async def upload_residente_video(
     departamento: str = Form(...)
 ):
     video_bytes = await video.read()
-    video_url = upload_video_to_supabase(video_bytes, video.filename)
-    residente = insert_residente(nombre, dni, departamento, video_url)
+    video_url = await repository.upload_video(video_bytes, video.filename)
+    residente = await repository.insert_residente(nombre, dni, departamento, video_url)
 
     return {"status": "ok", "residente": residente}
 
 
 @router.get("/")
-async def get_residentes():
-    return {"status": "ok", "data": get_all_residentes()}
+async def get_residentes(
+    limit: int = Query(RESIDENTES_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,      # next_cursor de la página anterior
+    fields: Optional[str] = None,      # ej: "nombre,estado"
+    estado: Optional[str] = None,
+):
+    try:
+        data, next_cursor = await repository.get_residentes_page(
+            limit=limit, cursor=cursor, fields=fields, estado=estado
+        )
+    except ValueError as e:
+        return {"status": "error", "msg": str(e)}
+    return {"status": "ok", "data": data, "next_cursor": next_cursor}
 
 # -----------------------------
 #   ENTRENAMIENTO
 # -----------------------------
 
 @router.get("/training-candidates")
-def get_training_candidates():
-    return {"status": "ok", "data": get_training_candidates_db()}
+async def get_training_candidates():
+    return {"status": "ok", "data": await repository.get_training_candidates()}
 
 
 class TrainDatasetIds(BaseModel):
     residentes: list[int]
 
 @router.post("/train-dataset")
-def train_dataset(data: TrainDatasetIds):
-    results = []
-    for resident_id in data.residentes:
-        resident = get_residente_by_id(resident_id)
-        if not resident:
-            continue
-        result = call_microservice_generate_dataset(resident)
-        update_residente_db(resident_id, {"necesita_entrenamiento": False})
-        results.append(result)
-    return {"status": "ok", "result": results}
+async def train_dataset(data: TrainDatasetIds, stream: bool = False):
+    # ✅ Una sola consulta para todos los residentes
+    residents = await repository.get_residentes_by_ids(data.residentes)
+
+    async def results():
+        trained = []
+        try:
+            async for result in generate_datasets(residents):
+                if result["status"] == "success":
+                    trained.append(result["resident_id"])
+                yield result
+        finally:
+            # ✅ Un solo UPDATE para todos los que terminaron bien. Protegido:
+            # si el cliente corta el stream la tarea se cancela, pero los
+            # datasets ya generados quedan marcados igual.
+            if trained:
+                await asyncio.shield(repository.mark_trained(trained))
+
+    if stream:
+        # NDJSON: una línea por residente apenas termina
+        async def lines():
+            async for result in results():
+                yield json.dumps(result) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return {"status": "ok", "result": [result async for result in results()]}
 
 
 @router.get("/{residente_id}")
 async def get_residente(residente_id: int):
-    data = get_residente_by_id(residente_id)
+    data = await repository.get_residente_by_id(residente_id)
     if not data:
         return {"status": "error", "msg": "Residente no encontrado"}
     return {"status": "ok", "data": data}
 
 
 @router.put("/{residente_id}")
-def update_residente(residente_id: int, payload: dict):
-    updated = update_residente_db(residente_id, payload)
+async def update_residente(residente_id: int, payload: dict):
+    updated = await repository.update_residente(residente_id, payload)
     return {"status": "ok", "updated": updated}
 
 
 @router.delete("/{residente_id}")
-def delete_residente(residente_id: int):
-    deleted = delete_residente_db(residente_id)
+async def delete_residente(residente_id: int):
+    deleted = await repository.delete_residente(residente_id)
     return {"status": "ok", "deleted": deleted}
 
 
@@ -1,9 +1,54 @@
-from config import SUPABASE_URL, SUPABASE_KEY, MICROSERVICIO_URL
+from config import (
+    SUPABASE_URL, SUPABASE_KEY, MICROSERVICIO_URL, RESIDENTES_CACHE_TTL, RESIDENTES_CACHE_SIZE
+)
 from supabase import create_client
-import requests
+from utils.ttl_cache import TTLCache
+import asyncio
+import httpx
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Lecturas de residentes: cambian pocas veces al día. Toda escritura la vacía.
+residentes_cache = TTLCache(ttl=RESIDENTES_CACHE_TTL, maxsize=RESIDENTES_CACHE_SIZE)
+
+# -------------------------
+#   PAGINACIÓN (keyset por id)
+# -------------------------
+
+ACCESOS_PAGE_SIZE = 100       # el historial de accesos solo crece
+RESIDENTES_PAGE_SIZE = 1000   # los residentes son pocos: una página alcanza
+MAX_PAGE_SIZE = 1000
+
+# Columnas que se pueden pedir con ?fields=
+RESIDENTES_COLUMNS = (
+    "id", "nombre", "dni", "departamento", "video_url", "estado", "necesita_entrenamiento",
+)
+ACCESOS_COLUMNS = (
+    "id", "tipo", "fecha", "hora", "imagen_url", "residente_id", "nombre_residente",
+)
+
+
+def parse_fields(fields, allowed):
+    """'nombre,estado' -> columnas validadas (el id va siempre: es el cursor)."""
+    if not fields:
+        return list(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Columnas no permitidas: {', '.join(unknown)}")
+    return ["id"] + [f for f in requested if f != "id"]
+
+
+def keyset_page(query, limit, cursor, descending):
+    """Aplica cursor/orden/límite; devuelve (filas, next_cursor)."""
+    if cursor is not None:
+        query = query.lt("id", cursor) if descending else query.gt("id", cursor)
+    # Se pide una fila de más para saber si hay otra página
+    rows = query.order("id", desc=descending).limit(limit + 1).execute().data or []
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]["id"]
+    return rows, None
+
 # -------------------------
 #     FUNCIONES BD
 # -------------------------
@@ -19,39 +64,73 @@ def insert_residente(nombre: str, dni: str, departamento: str, video_url: str):
     }
 
     response = supabase.table("residentes").insert(data).execute()
+    residentes_cache.invalidate()
     return response.data[0]
 
 
-def get_all_residentes():
-    return supabase.table("residentes").select("*").execute().data
+@residentes_cache.cached
+def get_residentes_page(limit=RESIDENTES_PAGE_SIZE, cursor=None, fields=None, estado=None):
+    columns = parse_fields(fields, RESIDENTES_COLUMNS)
+    query = supabase.table("residentes").select(",".join(columns))
+    if estado:
+        query = query.eq("estado", estado)
+    return keyset_page(query, limit, cursor, descending=False)
 
 
+@residentes_cache.cached
 def get_residente_by_id(residente_id: int):
     res = supabase.table("residentes").select("*").eq("id", residente_id).execute()
     return res.data[0] if res.data else None
 
 
+def get_residentes_by_ids(residente_ids: list[int]):
+    """Todos los residentes pedidos en una sola consulta."""
+    if not residente_ids:
+        return []
+    return supabase.table("residentes").select("*").in_("id", residente_ids).execute().data
+
+
 def update_residente_db(residente_id: int, payload: dict):
-    return (
+    data = (
         supabase.table("residentes")
         .update(payload)
         .eq("id", residente_id)
         .execute()
         .data
     )
+    residentes_cache.invalidate()
+    return data
+
+
+def mark_trained_db(residente_ids: list[int]):
+    """Baja el flag necesita_entrenamiento de varios residentes en un UPDATE."""
+    if not residente_ids:
+        return []
+    data = (
+        supabase.table("residentes")
+        .update({"necesita_entrenamiento": False})
+        .in_("id", residente_ids)
+        .execute()
+        .data
+    )
+    residentes_cache.invalidate()
+    return data
 
 
 def delete_residente_db(residente_id: int):
-    return (
+    data = (
         supabase.table("residentes")
         .update({"estado": "inactivo"})
         .eq("id", residente_id)
         .execute()
         .data
     )
+    residentes_cache.invalidate()
+    return data
 
 
 
+@residentes_cache.cached
 def get_training_candidates_db():
     return (
         supabase.table("residentes")
@@ -65,42 +144,156 @@ def get_training_candidates_db():
 
 
 
-def get_all_accesos():
-    response = supabase.table("accesos").select("""
-        id,
-        tipo,
-        fecha,
-        hora,
-        imagen_url,
-        residente_id,
-        residentes ( nombre )
-    """).execute()
+def get_residentes_cache_stats():
+    return residentes_cache.stats()
+
+
+def get_accesos_page(limit=ACCESOS_PAGE_SIZE, cursor=None, fields=None,
+                     desde=None, hasta=None, residente_id=None, tipo=None,
+                     q=None, conocido=None):
+    """
+    Accesos del más nuevo al más viejo, filtrados en la base.
 
-    data = response.data or []
+    q busca en el nombre del residente (ilike, deja fuera a los desconocidos);
+    conocido=True/False deja solo accesos con/sin residente.
+    """
+    columns = parse_fields(fields, ACCESOS_COLUMNS)
+    with_name = "nombre_residente" in columns
+    select = [c for c in columns if c != "nombre_residente"]
+    q = (q or "").strip().replace("%", "").replace("*", "")
+    if q:
+        # !inner: el filtro sobre el residente también filtra los accesos
+        select.append("residentes!inner ( nombre )")
+    elif with_name:
+        select.append("residentes ( nombre )")
 
+    query = supabase.table("accesos").select(",".join(select))
+    if desde:
+        query = query.gte("fecha", str(desde))
+    if hasta:
+        query = query.lte("fecha", str(hasta))
+    if residente_id is not None:
+        query = query.eq("residente_id", residente_id)
+    if tipo:
+        query = query.eq("tipo", tipo)
+    if conocido is not None:
+        query = query.not_.is_("residente_id", "null") if conocido else query.is_("residente_id", "null")
+    if q:
+        query = query.ilike("residentes.nombre", f"%{q}%")
+
+    data, next_cursor = keyset_page(query, limit, cursor, descending=True)
+
+    # Solo se procesa la página pedida
     for item in data:
-        if item.get("residentes"):
-            item["nombre_residente"] = item["residentes"]["nombre"]
-        else:
-            item["nombre_residente"] = "DESCONOCIDO"
+        if with_name:
+            if item.get("residentes"):
+                item["nombre_residente"] = item["residentes"]["nombre"]
+            else:
+                item["nombre_residente"] = "DESCONOCIDO"
         item.pop("residentes", None)
 
-    return data
+    return data, next_cursor
 
 
 # -------------------------
 #   LLAMADA AL MICROSERVICIO
 # -------------------------
 
-def call_microservice_generate_dataset(resident):
-    body = {
+JOB_POLL_INTERVAL = 2          # segundos entre consultas a /jobs/{id}
+JOB_TIMEOUT = 300              # espera máxima por residente desde que su trabajo corre
+JOB_QUEUE_TIMEOUT = 3600       # espera máxima en la cola del microservicio
+MICROSERVICE_CONCURRENCY = 8   # residentes en vuelo a la vez
+
+
+def dataset_request_body(resident):
+    return {
         "resident_id": resident["id"],
         "nombre": resident["nombre"],
         "video_path": resident["video_url"],
         "max_faces": 100,
         "skip_frames": 2,
         "augmentation": True,
+        # El microservicio entrena solo a este residente sobre el modelo actual
+        "train": True,
     }
-    res = requests.post(f"{MICROSERVICIO_URL}/generate-dataset", json=body, timeout=300)
-    
-    return res.json()
\ No newline at end of file
+
+
+async def wait_for_job(client: httpx.AsyncClient, job_id: str, timeout: float = JOB_TIMEOUT):
+    """
+    Consulta /jobs/{id} hasta que el trabajo termine (o se agote el tiempo).
+
+    El plazo `timeout` cuenta desde que el trabajo pasa a "running": el
+    microservicio corre pocos trabajos a la vez y el tiempo en cola no es
+    culpa del residente (esa espera la acota JOB_QUEUE_TIMEOUT).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + JOB_QUEUE_TIMEOUT
+    running = False
+    while True:
+        res = await client.get(f"/jobs/{job_id}")
+        job = res.json().get("job")
+        if job is None or job["state"] in ("success", "error"):
+            return job
+        if job["state"] == "running" and not running:
+            running = True
+            deadline = loop.time() + timeout
+        if loop.time() >= deadline:
+            return job
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+async def call_microservice_generate_dataset(client: httpx.AsyncClient, resident):
+    """
+    Encola el dataset de un residente y espera su trabajo. Si se deja de
+    esperar antes de que termine, el resultado es "pending" (no "error"):
+    el trabajo sigue en el microservicio y puede terminar bien.
+    """
+    try:
+        res = await client.post("/generate-dataset", json=dataset_request_body(resident))
+        response = res.json()
+        job = await wait_for_job(client, response["job_id"]) if response.get("job_id") else None
+    except (httpx.HTTPError, ValueError) as e:
+        return {"status": "error", "resident_id": resident["id"], "message": str(e)}
+
+    if job is not None and job["state"] == "success":
+        return {"status": "success", "resident_id": resident["id"], **job["result"]}
+    if job is not None and job["state"] in ("queued", "running"):
+        return {
+            "status": "pending",
+            "resident_id": resident["id"],
+            "message": f"El trabajo sigue {'en cola' if job['state'] == 'queued' else 'corriendo'}",
+            "job_id": response.get("job_id"),
+        }
+    return {
+        "status": "error",
+        "resident_id": resident["id"],
+        "message": (job or {}).get("error") or response.get("message", "Trabajo sin terminar"),
+        "job_id": response.get("job_id"),
+    }
+
+
+async def generate_datasets(residents):
+    """
+    Lanza la generación de todos los residentes en paralelo (como mucho
+    MICROSERVICE_CONCURRENCY a la vez, con un solo cliente HTTP y su pool de
+    conexiones) y entrega cada resultado apenas termina.
+
+    Si el consumidor deja de iterar (ej. el cliente cortó el stream), las
+    tareas pendientes se cancelan antes de cerrar el cliente HTTP.
+    """
+    semaphore = asyncio.Semaphore(MICROSERVICE_CONCURRENCY)
+    limits = httpx.Limits(max_connections=MICROSERVICE_CONCURRENCY)
+
+    async with httpx.AsyncClient(base_url=MICROSERVICIO_URL, timeout=30, limits=limits) as client:
+        async def run(resident):
+            async with semaphore:
+                return await call_microservice_generate_dataset(client, resident)
+
+        tasks = [asyncio.create_task(run(r)) for r in residents]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
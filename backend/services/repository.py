@@ -0,0 +1,93 @@
+"""
+Capa de datos async del backend.
+
+El cliente de Supabase es síncrono: llamarlo desde una ruta `async` bloquea
+el event loop y una consulta lenta frena a todas las demás peticiones. Cada
+función de aquí corre la consulta de db_services en un hilo, con límites
+propios para no agotar el threadpool general de FastAPI.
+
+Hay dos carriles: "bulk" (listados completos, subidas de video) y "point"
+(búsquedas por id y escrituras). Así un dashboard pidiendo listados pesados
+no deja en cola a las consultas cortas.
+
+Consultas independientes se pueden lanzar juntas:
+    (residentes, _), (accesos, _) = await asyncio.gather(
+        repository.get_residentes_page(), repository.get_accesos_page()
+    )
+"""
+from functools import partial
+
+from anyio import CapacityLimiter, to_thread
+
+from config import DB_CONCURRENCY, DB_BULK_CONCURRENCY
+from services import db_services as db
+from services.supabase_service import upload_video_to_supabase
+
+LANES = {"point": DB_CONCURRENCY, "bulk": DB_BULK_CONCURRENCY}
+_limiters = {}
+
+
+def limiter(lane):
+    # Se crean dentro del event loop la primera vez que se usan
+    if lane not in _limiters:
+        _limiters[lane] = CapacityLimiter(LANES[lane])
+    return _limiters[lane]
+
+
+async def run_db(fn, *args, lane="point", **kwargs):
+    """Ejecuta una llamada síncrona a Supabase sin bloquear el event loop."""
+    # Lecturas en caché: un acierto se responde sin pasar por un hilo
+    lookup = getattr(fn, "lookup", None)
+    if lookup is not None:
+        found, value = lookup(*args, **kwargs)
+        if found:
+            return value
+    return await to_thread.run_sync(partial(fn, *args, **kwargs), limiter=limiter(lane))
+
+
+# -------------------------
+#     RESIDENTES
+# -------------------------
+
+async def insert_residente(nombre: str, dni: str, departamento: str, video_url: str):
+    return await run_db(db.insert_residente, nombre, dni, departamento, video_url)
+
+
+async def get_residentes_page(**params):
+    return await run_db(db.get_residentes_page, lane="bulk", **params)
+
+
+async def get_residente_by_id(residente_id: int):
+    return await run_db(db.get_residente_by_id, residente_id)
+
+
+async def get_residentes_by_ids(residente_ids: list[int]):
+    return await run_db(db.get_residentes_by_ids, residente_ids)
+
+
+async def update_residente(residente_id: int, payload: dict):
+    return await run_db(db.update_residente_db, residente_id, payload)
+
+
+async def mark_trained(residente_ids: list[int]):
+    return await run_db(db.mark_trained_db, residente_ids)
+
+
+async def delete_residente(residente_id: int):
+    return await run_db(db.delete_residente_db, residente_id)
+
+
+async def get_training_candidates():
+    return await run_db(db.get_training_candidates_db, lane="bulk")
+
+
+async def upload_video(file_bytes, filename: str):
+    return await run_db(upload_video_to_supabase, file_bytes, filename, lane="bulk")
+
+
+# -------------------------
+#     ACCESOS
+# -------------------------
+
+async def get_accesos_page(**params):
+    return await run_db(db.get_accesos_page, lane="bulk", **params)
@@ -0,0 +1,91 @@
+"""
+Caché TTL + LRU en proceso para lecturas de Supabase.
+
+Los valores se devuelven tal cual, sin copiar: todos los que aciertan la
+misma clave comparten las mismas listas y dicts. Quien los reciba no debe
+modificarlos (copiar antes de editar); un cambio quedaría en la caché y lo
+verían las siguientes lecturas hasta que venza o se invalide.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()   # clave -> (vence_en, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0         # cambia en cada invalidate()
+
+    def get(self, key, count_miss=True):
+        """Devuelve (encontrado, valor)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._data[key]
+            if count_miss:
+                self.misses += 1
+            return False, None
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            # Una lectura que empezó antes de invalidate() no guarda su resultado
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self):
+        """Vacía la caché (después de cualquier escritura)."""
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def cached(self, fn):
+        """
+        Decorador read-through: la clave es la función y sus argumentos.
+        wrapper.lookup(*args, **kwargs) consulta la caché sin llamar a fn
+        (lo usa el repositorio async para no saltar a un hilo en un acierto).
+        """
+        def key_for(args, kwargs):
+            return (fn.__name__, args, tuple(sorted(kwargs.items())))
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = key_for(args, kwargs)
+            found, value = self.get(key)
+            if found:
+                return value
+            generation = self._generation
+            value = fn(*args, **kwargs)
+            self.set(key, value, generation)
+            return value
+
+        wrapper.lookup = lambda *args, **kwargs: self.get(key_for(args, kwargs), count_miss=False)
+        return wrapper
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -2,27 +2,23 @@
 from fastapi import FastAPI
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-import requests
 import os
-import uuid
-import cv2
 import json
 import time
 from queue import Queue
-import threading
 
 from extract_from_video import extract_faces
-from train_model import train_model
+from video_download import check_video_source, open_video_source, remove_temp
+from jobs import JobManager, worker_budget
+from train_model import train_model, train_resident, MAX_SAMPLES_PER_RESIDENT
+from database import get_event_writer_metrics, requeue_dead_events
+from main import RECOGNIZER_BACKEND
 
 log_queue = Queue()
 
-# ✅ Control global del stream
-camera_active = False
-camera_lock = threading.Lock()
-current_cap = None
-
 def log_event(message, level="info"):
     event = {
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -32,6 +28,9 @@ def log_event(message, level="info"):
     log_queue.put(event)
     print(f"[LOG] {message}")
 
+# ✅ Dataset y entrenamiento corren en segundo plano (ver jobs.py)
+jobs = JobManager(log_event)
+
 app = FastAPI()
 
 app.add_middleware(
@@ -48,223 +47,389 @@ class DatasetRequest(BaseModel):
     video_path: str
     max_faces: int = 100
     skip_frames: int = 2
+    sample_frames: Optional[int] = None   # N frames repartidos en todo el video
     augmentation: bool = True
+    select_best: bool = True # elegir los recortes más nítidos y sin duplicados
+    fill_duplicates: bool = False  # completar max_faces con duplicados si faltan
+    packed: bool = False     # faces.npy + index.json en lugar de JPEG sueltos
+    train: bool = False      # entrenar incrementalmente al terminar
+    backend: str = RECOGNIZER_BACKEND
 
 class TrainRequest(BaseModel):
     dataset_path: str = "./dataset"
+    backend: str = RECOGNIZER_BACKEND   # "lbph", "lbph_np" o "sface"
+    max_samples: Optional[int] = MAX_SAMPLES_PER_RESIDENT   # prototipos por residente
 
+class TrainResidentRequest(BaseModel):
+    folder: str              # carpeta dentro del dataset (ej: "5_Carlos")
+    resident_id: Optional[int] = None
+    dataset_path: str = "./dataset"
+    backend: str = RECOGNIZER_BACKEND
 
-@app.post("/generate-dataset")
-def generate_dataset(request: DatasetRequest):
+class TrackingRequest(BaseModel):
+    # Solo se aplican los campos enviados
+    mode: Optional[str] = None          # "track" o "detect"
+    detect_every: Optional[int] = None
+    detection_scale: Optional[float] = None
+
+class CameraRequest(BaseModel):
+    id: str
+    source: str = "0"   # índice local, ruta de archivo o URL (rtsp/http)
+
+
+def job_response(job, merged):
+    return {
+        "status": "queued",
+        "message": "Unido al trabajo en cola" if merged else "Trabajo encolado",
+        "job_id": job.id,
+        "merged": merged,
+        "job": job.status()
+    }
+
+
+def run_generate_dataset(job, request):
+    temp_path, capture = None, None
     try:
-        log_event(f"Iniciando generación de dataset para {request.nombre} (ID: {request.resident_id})")
-        
-        temp_name = f"temp_{uuid.uuid4()}.mp4"
-        temp_path = f"./temp_videos/{temp_name}"
-        os.makedirs("./temp_videos", exist_ok=True)
-
-        log_event("Descargando video desde Supabase...")
-        response = requests.get(request.video_path, stream=True, timeout=30)
-        
-        if response.status_code != 200:
-            log_event("Error: No se pudo descargar el video", "error")
-            return {"status": "error", "message": "No se pudo descargar el video"}
-
-        with open(temp_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        job.log_event(f"Iniciando generación de dataset para {request.nombre} (ID: {request.resident_id})")
 
+        # ✅ Se decodifica desde la URL mientras llega; si no se puede,
+        # descarga por rangos en paralelo a un temporal
+        source, temp_path, capture = open_video_source(request.video_path, job.log_event)
+
+        job.report(force=True, stage="extrayendo")
         count = extract_faces(
-            video_path=temp_path,
+            video_path=source,
+            capture=capture,
             residente_id=request.resident_id,
             nombre=request.nombre,
             skip_frames=request.skip_frames,
             max_faces=request.max_faces,
-            use_augmentation=request.augmentation
+            use_augmentation=request.augmentation,
+            packed=request.packed,
+            sample_frames=request.sample_frames,
+            select_best=request.select_best,
+            fill_duplicates=request.fill_duplicates,
+            workers=worker_budget(),
+            progress=job.report
         )
 
-        os.remove(temp_path)
+        job.report(force=True, stage="dataset generado", images=count)
         log_event(f"Dataset generado: {count} imágenes", "success")
-        
-        return {
-            "status": "success",
+
+        result = {
             "message": f"Dataset generado para {request.nombre}",
             "resident_id": request.resident_id,
             "images_count": count
         }
 
-    except Exception as e:
-        log_event(f"Error: {str(e)}", "error")
+        # ✅ Solo se entrena la carpeta de este residente
+        if request.train:
+            job.report(force=True, stage="entrenando")
+            result["model_path"] = train_resident_folder(
+                f"{request.resident_id}_{request.nombre}", request.resident_id,
+                "./dataset", request.backend
+            )
+
+        return result
+
+    finally:
+        if capture is not None:
+            capture.release()   # extract_faces ya la libera; por si falló antes
+        remove_temp(temp_path)
+
+
+@app.post("/generate-dataset")
+def generate_dataset(request: DatasetRequest):
+    try:
+        check_video_source(request.video_path)
+    except ValueError as e:
         return {"status": "error", "message": str(e)}
 
+    # Reenvíos del mismo residente se unen al trabajo que ya está en curso
+    job, merged = jobs.submit(
+        "dataset", f"dataset:{request.resident_id}", run_generate_dataset, request
+    )
+    return job_response(job, merged)
+
+
+def run_train_model(job, request):
+    log_event("Iniciando entrenamiento...")
+    dataset_real = os.path.abspath(request.dataset_path)
+    # train_model serializa los entrenamientos (TRAIN_LOCK en train_model.py)
+    model_path = train_model(
+        dataset_real, backend=request.backend, max_samples=request.max_samples,
+        workers=worker_budget()
+    )
+    log_event("Modelo entrenado correctamente", "success")
+
+    # ✅ Las cámaras siguen corriendo; el modelo nuevo entra al terminar de cargar
+    reload_model("entrenamiento")
+
+    return {
+        "message": "Modelo entrenado correctamente",
+        "model_path": model_path,
+        "reloading": True
+    }
+
 
 @app.post("/train-model")
 def train(request: TrainRequest):
+    job, merged = jobs.submit("train-model", "train-model", run_train_model, request)
+    return job_response(job, merged)
+
+
+def train_resident_folder(folder, resident_id, dataset_path, backend):
+    log_event(f"Entrenamiento incremental: {folder}")
+    start = time.perf_counter()
+    model_path = train_resident(
+        folder, os.path.abspath(dataset_path), backend=backend, resident_id=resident_id,
+        workers=worker_budget()
+    )
+    log_event(f"Residente {folder} entrenado en {time.perf_counter() - start:.1f} s", "success")
+    reload_model("entrenamiento incremental")
+    return model_path
+
+
+def run_train_resident(job, request):
+    model_path = train_resident_folder(
+        request.folder, request.resident_id, request.dataset_path, request.backend
+    )
+    return {
+        "message": f"Residente {request.folder} entrenado",
+        "model_path": model_path,
+        "reloading": True
+    }
+
+
+@app.post("/train-resident")
+def train_one_resident(request: TrainResidentRequest):
+    job, merged = jobs.submit(
+        "train-resident", f"train:{request.folder}", run_train_resident, request
+    )
+    return job_response(job, merged)
+
+
+# ============================================
+#   TRABAJOS
+# ============================================
+@app.get("/jobs")
+def list_jobs():
+    return {"status": "success", "jobs": [job.status() for job in jobs.list()], **jobs.stats()}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        return {"status": "error", "message": f"El trabajo '{job_id}' no existe"}
+    return {"status": "success", "job": job.status()}
+
+
+from camera_registry import CameraRegistry, DEFAULT_CAMERA_ID
+from main import model_store, reload_model
+
+# ✅ Registro de cámaras (cada una con su pipeline y su estado)
+cameras = CameraRegistry(log_event)
+
+# ✅ Recarga en caliente si cambian face_model.xml / labels.txt / mapping.json
+model_store.log_event = log_event
+model_store.start_watcher()
+
+
+# ============================================
+#   MODELO
+# ============================================
+@app.get("/model/status")
+def model_status():
+    return {"status": "success", "model": model_store.status()}
+
+
+@app.post("/model/reload")
+def model_reload():
+    ok = model_store.reload("manual")
+    if not ok:
+        return {"status": "error", "message": model_store.last_error, "model": model_store.status()}
+    return {"status": "success", "message": "Modelo recargado", "model": model_store.status()}
+
+
+# ============================================
+#   MULTI-CÁMARA
+# ============================================
+@app.get("/cameras")
+def list_cameras():
+    return {"status": "success", "cameras": [c.status() for c in cameras.list()]}
+
+
+@app.post("/cameras")
+def add_camera(request: CameraRequest):
     try:
-        log_event("Iniciando entrenamiento...")
-        dataset_real = os.path.abspath(request.dataset_path)
-        model_path = train_model(dataset_real)
-        log_event("Modelo entrenado correctamente", "success")
-        
-        return {
-            "status": "success",
-            "message": "Modelo entrenado correctamente",
-            "model_path": model_path
-        }
-    except Exception as e:
-        log_event(f"Error: {str(e)}", "error")
+        camera = cameras.add(request.id, request.source)
+    except ValueError as e:
         return {"status": "error", "message": str(e)}
 
+    log_event(f"📷 Cámara registrada: {camera.id} ({camera.source})")
+    return {"status": "success", "camera": camera.status()}
 
-from main import process_frame_with_logger
 
-# ✅ Iniciar cámara manualmente
-@app.post("/camera/start")
-def start_camera():
-    global camera_active, current_cap
-    
-    with camera_lock:
-        if camera_active:
-            return {"status": "already_running", "message": "La cámara ya está activa"}
-        
-        # ✅ Liberar cámara anterior si existe
-        if current_cap is not None:
-            current_cap.release()
-            time.sleep(0.5)
-        
-        current_cap = cv2.VideoCapture(0)
-        
-        # ✅ Dar tiempo a la cámara para inicializar
-        time.sleep(0.5)
-        
-        if not current_cap.isOpened():
-            log_event("❌ No se pudo abrir la cámara", "error")
-            current_cap = None
-            return {"status": "error", "message": "No se pudo abrir la cámara"}
-        
-        # ✅ Verificar que pueda leer frames
-        ret, _ = current_cap.read()
-        if not ret:
-            log_event("❌ La cámara se abrió pero no puede leer frames", "error")
-            current_cap.release()
-            current_cap = None
-            return {"status": "error", "message": "La cámara no puede capturar frames"}
-        
-        camera_active = True
-        log_event("✅ Cámara iniciada correctamente", "success")
-        
-        return {"status": "success", "message": "Cámara iniciada"}
+@app.delete("/cameras/{camera_id}")
+def remove_camera(camera_id: str):
+    if not cameras.remove(camera_id):
+        return {"status": "error", "message": f"La cámara '{camera_id}' no existe"}
+    return {"status": "success", "message": "Cámara eliminada"}
 
 
-# ✅ Detener cámara manualmente
-@app.post("/camera/stop")
-def stop_camera():
-    global camera_active, current_cap
-    
-    with camera_lock:
-        camera_active = False
-        
-        if current_cap is not None:
-            current_cap.release()
-            current_cap = None
-        
-        log_event("🔓 Cámara detenida", "warning")
-        
-        return {"status": "success", "message": "Cámara detenida"}
+@app.post("/cameras/{camera_id}/start")
+def start_camera_by_id(camera_id: str):
+    camera = cameras.get(camera_id)
+    if camera is not None and camera.active:
+        return {"status": "already_running", "message": "La cámara ya está activa"}
 
+    ok, message = cameras.start(camera_id)
+    return {"status": "success" if ok else "error", "message": message}
 
-# ✅ Estado de la cámara
-@app.get("/camera/status")
-def camera_status():
-    is_opened = current_cap.isOpened() if current_cap is not None else False
-    return {
-        "active": camera_active,
-        "camera_opened": is_opened,
-        "message": "Cámara activa" if camera_active else "Cámara inactiva"
-    }
+
+@app.post("/cameras/{camera_id}/stop")
+def stop_camera_by_id(camera_id: str):
+    ok, message = cameras.stop(camera_id)
+    return {"status": "success" if ok else "error", "message": message}
+
+
+@app.get("/cameras/{camera_id}/status")
+def camera_status_by_id(camera_id: str):
+    camera = cameras.get(camera_id)
+    if camera is None:
+        return {"status": "error", "message": f"La cámara '{camera_id}' no existe"}
+    return camera.status()
+
+
+# ✅ Configurar modo de seguimiento (latencia vs CPU)
+@app.post("/cameras/{camera_id}/tracking")
+def camera_tracking_by_id(camera_id: str, request: TrackingRequest):
+    camera = cameras.get(camera_id)
+    if camera is None:
+        return {"status": "error", "message": f"La cámara '{camera_id}' no existe"}
+
+    try:
+        camera.recognizer.configure_tracking(
+            request.mode, request.detect_every, request.detection_scale
+        )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    tracking = camera.recognizer.tracking_stats()
+    camera.log_event(f"🎯 Modo de seguimiento: {tracking['mode']} (detectar cada {tracking['detect_every']} frames)")
+    return {"status": "success", "tracking": tracking}
 
 
 # ✅ Stream de video (solo funciona si la cámara está activa)
-def gen_frames():
-    global camera_active, current_cap
+def gen_frames(camera):
+    pipeline = camera.pipeline
     
-    log_event("📡 Cliente conectado al stream")
+    camera.log_event("📡 Cliente conectado al stream")
     
-    # ✅ Verificar que la cámara esté abierta
-    if current_cap is None or not current_cap.isOpened():
-        log_event("❌ Stream solicitado pero cámara no disponible", "error")
+    # ✅ Verificar que el pipeline esté corriendo
+    if pipeline is None or not pipeline.running:
+        camera.log_event("❌ Stream solicitado pero cámara no disponible", "error")
         return
     
     frame_count = 0
-    error_count = 0
     
     try:
-        while camera_active:
-            # ✅ Verificar que current_cap sigue existiendo
-            if current_cap is None:
-                log_event("⚠️ current_cap es None, terminando stream", "warning")
-                break
-            
-            success, frame = current_cap.read()
-            
-            if not success:
-                error_count += 1
-                if error_count % 30 == 0:  # Log cada 30 errores
-                    log_event(f"⚠️ No se pudo leer frame (errores: {error_count})", "warning")
-                
-                if error_count > 100:
-                    log_event("❌ Demasiados errores leyendo frames, deteniendo stream", "error")
-                    break
-                
-                time.sleep(0.01)
-                continue
-            
-            # Reset error count si lee correctamente
-            error_count = 0
+        for jpeg in pipeline.frames():
             frame_count += 1
-            
-            # Log cada 60 frames (2 segundos aprox)
-            if frame_count % 60 == 0:
-                log_event(f"📊 Frame {frame_count} procesado correctamente", "info")
-            
-            processed = process_frame_with_logger(frame, log_event)
-            ret, buffer = cv2.imencode('.jpg', processed)
-            
-            if not ret:
-                continue
-            
             yield (
                 b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" + buffer.tobytes() + b"\r\n"
+                b"Content-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
             )
     
     except GeneratorExit:
-        log_event("🔌 Cliente desconectado del stream")
+        camera.log_event("🔌 Cliente desconectado del stream")
     
     except Exception as e:
-        log_event(f"❌ Error en stream: {str(e)}", "error")
+        camera.log_event(f"❌ Error en stream: {str(e)}", "error")
     
     finally:
-        log_event(f"🏁 Stream finalizado. Total frames procesados: {frame_count}")
+        camera.log_event(f"🏁 Stream finalizado. Total frames enviados: {frame_count}")
 
 
-@app.get("/video-stream")
-def video_stream():
-    if not camera_active:
-        log_event("⚠️ Intento de acceder al stream con cámara inactiva", "warning")
-        return {"status": "error", "message": "La cámara no está activa. Usa POST /camera/start primero"}
-    
-    if current_cap is None or not current_cap.isOpened():
-        log_event("❌ Cámara marcada como activa pero no está abierta", "error")
-        return {"status": "error", "message": "Error: La cámara no está disponible"}
+@app.get("/cameras/{camera_id}/stream")
+def camera_stream(camera_id: str):
+    camera = cameras.get(camera_id)
+    if camera is None:
+        return {"status": "error", "message": f"La cámara '{camera_id}' no existe"}
+
+    if not camera.active:
+        camera.log_event("⚠️ Intento de acceder al stream con cámara inactiva", "warning")
+        return {"status": "error", "message": f"La cámara no está activa. Usa POST /cameras/{camera_id}/start primero"}
     
     return StreamingResponse(
-        gen_frames(),
+        gen_frames(camera),
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
 
+# ============================================
+#   CÁMARA POR DEFECTO (compatibilidad con el frontend)
+# ============================================
+def default_camera():
+    """Devuelve (cámara, None) o (None, respuesta de error) si el registro está lleno."""
+    try:
+        return cameras.get_or_add(DEFAULT_CAMERA_ID, DEFAULT_CAMERA_ID), None
+    except ValueError as e:
+        return None, {"status": "error", "message": str(e)}
+
+
+# ✅ Iniciar cámara manualmente
+@app.post("/camera/start")
+def start_camera():
+    _, error = default_camera()
+    return error or start_camera_by_id(DEFAULT_CAMERA_ID)
+
+
+# ✅ Detener cámara manualmente
+@app.post("/camera/stop")
+def stop_camera():
+    _, error = default_camera()
+    return error or stop_camera_by_id(DEFAULT_CAMERA_ID)
+
+
+# ✅ Estado de la cámara
+@app.get("/camera/status")
+def camera_status():
+    camera, error = default_camera()
+    return error or camera.status()
+
+
+@app.post("/camera/tracking")
+def camera_tracking(request: TrackingRequest):
+    _, error = default_camera()
+    return error or camera_tracking_by_id(DEFAULT_CAMERA_ID, request)
+
+
+@app.get("/video-stream")
+def video_stream():
+    _, error = default_camera()
+    return error or camera_stream(DEFAULT_CAMERA_ID)
+
+
+# ✅ Métricas del escritor de accesos (cola + latencia de envío), modelo y trabajos
+@app.get("/metrics")
+def metrics():
+    return {
+        "access_events": get_event_writer_metrics(),
+        "model": model_store.status(),
+        "jobs": jobs.stats()
+    }
+
+
+# ✅ Reintenta los accesos que quedaron en la tabla dead (todos o los IDs dados)
+@app.post("/access-events/requeue")
+def requeue_access_events(ids: Optional[List[int]] = None):
+    count = requeue_dead_events(ids)
+    log_event(f"{count} accesos descartados devueltos a la cola")
+    return {"status": "success", "requeued": count}
+
+
 def stream_logs():
     while True:
         event = log_queue.get()
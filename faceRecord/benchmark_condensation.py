@@ -0,0 +1,102 @@
+# benchmark_condensation.py
+"""
+Compromiso precisión / latencia de la condensación de muestras LBPH.
+
+Separa una fracción de las imágenes originales de cada residente como
+prueba, preprocesa el resto igual que train_model (con augmentación) y
+para cada límite de prototipos por residente entrena LBPH y mide
+precisión top-1, latencia media de predict y tamaño del modelo.
+
+Uso:
+    python benchmark_condensation.py ./dataset --caps 0 600 300 150 75
+    (0 = sin condensar)
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from packed_dataset import read_faces
+from recognizers import LBPH_THRESHOLD
+from train_model import FACE_SIZE, condense, normalize_image, preprocess_faces
+
+
+def split_dataset(base_dir, test_ratio):
+    folders = sorted(
+        d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))
+    )
+
+    train, test = [], []
+    for label, folder in enumerate(folders):
+        images = [
+            normalize_image(cv2.resize(image, (FACE_SIZE, FACE_SIZE)))
+            for image in read_faces(os.path.join(base_dir, folder))
+        ]
+        if len(images) < 2:
+            continue
+        n_test = max(1, int(len(images) * test_ratio))
+        train.append((label, preprocess_faces(images[:-n_test], augment=True)))
+        test += [(img, label) for img in images[-n_test:]]
+    return train, test
+
+
+def bench_cap(train, test, cap):
+    start = time.perf_counter()
+    faces, labels = [], []
+    for label, samples in train:
+        kept = samples[condense(samples, cap)]
+        faces += list(kept)
+        labels += [label] * len(kept)
+    condense_s = time.perf_counter() - start
+
+    model = cv2.face.LBPHFaceRecognizer_create()
+    start = time.perf_counter()
+    model.train(faces, np.array(labels))
+    train_s = time.perf_counter() - start
+
+    hits, elapsed = 0, 0.0
+    for img, label in test:
+        start = time.perf_counter()
+        pred, distance = model.predict(img)
+        elapsed += time.perf_counter() - start
+        hits += pred == label and distance < LBPH_THRESHOLD
+
+    return {
+        "samples": len(faces),
+        "accuracy": hits / len(test),
+        "ms": 1000 * elapsed / len(test),
+        "condense_s": condense_s,
+        "train_s": train_s,
+    }
+
+
+def run(base_dir, caps, test_ratio):
+    train, test = split_dataset(base_dir, test_ratio)
+    if not test:
+        print("[ERROR] No hay suficientes imágenes para evaluar")
+        return
+
+    print(f"\n{'='*78}")
+    print(f"  {len(train)} residentes, {len(test)} imágenes de prueba")
+    print(f"{'='*78}")
+    print(f"  {'Límite':>8} {'Muestras':>9} {'Precisión':>10} {'ms/predict':>11} "
+          f"{'Condensar (s)':>14} {'Entreno (s)':>12}")
+
+    for cap in caps:
+        r = bench_cap(train, test, cap or None)
+        print(f"  {cap or 'todas':>8} {r['samples']:>9} {r['accuracy']:>10.1%} {r['ms']:>11.2f} "
+              f"{r['condense_s']:>14.2f} {r['train_s']:>12.2f}")
+
+    print(f"{'='*78}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de condensación LBPH")
+    parser.add_argument("dataset", nargs="?", default="dataset")
+    parser.add_argument("--caps", nargs="+", type=int, default=[0, 600, 300, 150, 75])
+    parser.add_argument("--test-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    run(args.dataset, args.caps, args.test_ratio)
@@ -0,0 +1,102 @@
+# benchmark_detection.py
+"""
+Benchmark de detección multi-resolución sobre video grabado.
+
+Para cada escala mide FPS de detección y recall respecto a la detección a
+resolución completa (referencia), emparejando cajas por IoU.
+
+Uso:
+    python benchmark_detection.py ../videos/Carlos.mp4 [--scales 1 0.5 0.25]
+"""
+import argparse
+import time
+
+import cv2
+
+from detection import detect_faces, MIN_FACE_SIZE
+from tracking import iou
+
+IOU_THRESHOLD = 0.5
+
+
+def load_frames(video_path, max_frames):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"No se pudo abrir el video: {video_path}")
+
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    cap.release()
+    return frames
+
+
+def count_matches(reference, boxes):
+    used = set()
+    matches = 0
+    for ref in reference:
+        best, best_i = 0.0, None
+        for i, box in enumerate(boxes):
+            if i in used:
+                continue
+            score = iou(ref, box)
+            if score > best:
+                best, best_i = score, i
+        if best >= IOU_THRESHOLD:
+            used.add(best_i)
+            matches += 1
+    return matches
+
+
+def run(video_paths, scales, max_frames, min_size):
+    frames = []
+    for path in video_paths:
+        frames.extend(load_frames(path, max_frames))
+
+    if not frames:
+        print("[ERROR] No se leyeron frames")
+        return
+
+    h, w = frames[0].shape
+    print(f"[INFO] {len(frames)} frames de {w}x{h}, min_size={min_size}px")
+
+    # Referencia: detección a resolución completa
+    reference = [detect_faces(g, scale=1.0, min_size=min_size) for g in frames]
+    total_ref = sum(len(r) for r in reference)
+
+    print(f"\n{'='*50}")
+    print(f"  {'Escala':>8} {'FPS':>8} {'ms/frame':>10} {'Recall':>8} {'Cajas':>7}")
+    print(f"{'='*50}")
+
+    for scale in scales:
+        matched = 0
+        found = 0
+        start = time.perf_counter()
+        results = [detect_faces(g, scale=scale, min_size=min_size) for g in frames]
+        elapsed = time.perf_counter() - start
+
+        for ref, boxes in zip(reference, results):
+            found += len(boxes)
+            matched += count_matches(ref, boxes)
+
+        fps = len(frames) / elapsed if elapsed > 0 else 0.0
+        recall = matched / total_ref if total_ref else 0.0
+        print(f"  {scale:>8.2f} {fps:>8.1f} {1000 * elapsed / len(frames):>10.2f} "
+              f"{recall:>8.1%} {found:>7}")
+
+    print(f"{'='*50}")
+    print(f"  Rostros de referencia: {total_ref}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de escala de detección")
+    parser.add_argument("videos", nargs="+", help="videos grabados (mp4/avi)")
+    parser.add_argument("--scales", nargs="+", type=float, default=[1.0, 0.5, 0.25])
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--min-size", type=int, default=MIN_FACE_SIZE)
+    args = parser.parse_args()
+
+    run(args.videos, args.scales, args.max_frames, args.min_size)
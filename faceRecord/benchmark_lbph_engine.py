@@ -0,0 +1,119 @@
+# benchmark_lbph_engine.py
+"""
+Motor LBPH NumPy frente a cv2.face LBPH con el mismo modelo.
+
+Entrena OpenCV con el dataset (como train_model, sin condensar), convierte
+los histogramas al motor NumPy y compara sobre las imágenes de prueba:
+coincidencia de label, error máximo de distancia, celdas saturadas, memoria
+de la galería y latencia (un rostro por llamada y lotes de varios rostros por
+frame).
+
+A los rostros de prueba se suman imágenes planas (todos los grises de 0 a
+255 cada 15): las zonas planas o saturadas son donde un LBP reimplementado
+se aparta de OpenCV. También se comparan bin a bin los histogramas del
+motor con los de cv2 sobre rostros e imágenes planas.
+
+Con --min-agree sirve de chequeo de paridad: termina con código 1 si algún
+dtype coincide con OpenCV en menos de esa fracción de los rostros o si algún
+bin del histograma difiere.
+
+Uso:
+    python benchmark_lbph_engine.py ./dataset --batch 4
+    python benchmark_lbph_engine.py ./dataset --min-agree 0.99
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmark_condensation import split_dataset
+from lbph_engine import LBPHEngine
+
+
+def flat_images(size, step=15):
+    return [np.full((size, size), v, dtype=np.uint8) for v in range(0, 256, step)]
+
+
+def histogram_parity(engine, faces):
+    """Bins distintos entre engine.histogram_counts y cv2 (rostros + imágenes planas)."""
+    probe = [np.ascontiguousarray(f) for f in faces[:64]] + flat_images(engine.face_size, step=1)
+    model = cv2.face.LBPHFaceRecognizer_create(engine.radius, engine.neighbors,
+                                               engine.grid_x, engine.grid_y)
+    model.train(probe, np.arange(len(probe), dtype=np.int32))
+    expected = np.rint(np.asarray(model.getHistograms()).reshape(len(probe), -1) * engine.cell_area)
+    return int((engine.histogram_counts(probe) != expected).sum())
+
+
+def run(base_dir, test_ratio, batch):
+    """Imprime la tabla y devuelve {dtype: coincidencia} (None sin datos)."""
+    train, test = split_dataset(base_dir, test_ratio)
+    if not test:
+        print("[ERROR] No hay suficientes imágenes para evaluar")
+        return None
+
+    faces = [face for _, samples in train for face in samples]
+    labels = np.concatenate([[label] * len(samples) for label, samples in train])
+    model = cv2.face.LBPHFaceRecognizer_create()
+    model.train(faces, labels)
+    opencv_mb = sum(h.nbytes for h in model.getHistograms()) / 1e6
+
+    images = [img for img, _ in test] + flat_images(faces[0].shape[0])
+    start = time.perf_counter()
+    expected = [model.predict(img) for img in images]
+    opencv_ms = 1000 * (time.perf_counter() - start) / len(images)
+
+    print(f"\n{'='*78}")
+    print(f"  {len(faces)} muestras, {len(images)} rostros de prueba, lotes de {batch}")
+    print(f"{'='*78}")
+    print(f"  {'Motor':>12} {'MB':>8} {'Coincide':>9} {'Error máx':>10} {'Saturadas':>10} "
+          f"{'ms/rostro':>10} {'ms/lote':>9}")
+    print(f"  {'opencv':>12} {opencv_mb:>8.1f} {'-':>9} {'-':>10} {'-':>10} {opencv_ms:>10.2f} "
+          f"{opencv_ms * batch:>9.2f}")
+
+    agreement = {}
+
+    for dtype in (np.uint16, np.uint8):
+        engine = LBPHEngine.from_opencv(model, dtype=dtype)
+
+        start = time.perf_counter()
+        got = [engine.predict(img) for img in images]
+        single_ms = 1000 * (time.perf_counter() - start) / len(images)
+
+        start = time.perf_counter()
+        for i in range(0, len(images), batch):
+            engine.search(images[i:i + batch], k=1)
+        batches = (len(images) + batch - 1) // batch
+        batch_ms = 1000 * (time.perf_counter() - start) / batches
+
+        agree = np.mean([g[0] == e[0] for g, e in zip(got, expected)])
+        max_err = max(abs(g[1] - e[1]) for g, e in zip(got, expected))
+        agreement[np.dtype(dtype).name] = agree
+        print(f"  {'numpy ' + np.dtype(dtype).name:>12} {engine.nbytes / 1e6:>8.1f} {agree:>9.1%} "
+              f"{max_err:>10.4f} {engine.saturation():>10.3%} {single_ms:>10.2f} {batch_ms:>9.2f}")
+
+    mismatched = histogram_parity(LBPHEngine(), faces)
+    print(f"  Histogramas vs cv2: {mismatched} bins distintos (rostros + imágenes planas)")
+    print(f"{'='*78}\n")
+    if mismatched:
+        agreement["histogramas"] = 0.0
+    return agreement
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Motor LBPH NumPy vs OpenCV")
+    parser.add_argument("dataset", nargs="?", default="dataset")
+    parser.add_argument("--test-ratio", type=float, default=0.2)
+    parser.add_argument("--batch", type=int, default=4, help="rostros por frame")
+    parser.add_argument("--min-agree", type=float, default=None,
+                        help="coincidencia mínima con OpenCV (chequeo de paridad)")
+    args = parser.parse_args()
+
+    agreement = run(args.dataset, args.test_ratio, args.batch)
+    if args.min_agree is not None:
+        failed = {k: v for k, v in (agreement or {}).items() if v < args.min_agree}
+        if agreement is None or failed:
+            print(f"[ERROR] Paridad con OpenCV por debajo de {args.min_agree:.1%}: {failed}")
+            sys.exit(1)
+        print(f"[OK] Paridad con OpenCV ≥ {args.min_agree:.1%} en todos los dtypes")
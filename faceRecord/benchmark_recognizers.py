@@ -0,0 +1,127 @@
+# benchmark_recognizers.py
+"""
+Benchmark LBPH vs SFace a medida que crece el número de residentes.
+
+Para cada tamaño de galería toma las primeras R carpetas del dataset, separa
+una fracción de imágenes originales como prueba y mide latencia media de
+predict (ms) y precisión top-1 de cada backend.
+
+Uso:
+    python benchmark_recognizers.py ./dataset --sizes 5 10 20 50
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from packed_dataset import read_faces
+from recognizers import SFaceBackend, LBPH_THRESHOLD, SFACE_MODEL, load_sface
+from train_model import FACE_SIZE, augment_image, normalize_image
+
+
+def load_folder(folder_path):
+    return [
+        normalize_image(cv2.resize(image, (FACE_SIZE, FACE_SIZE)))
+        for image in read_faces(folder_path)
+    ]
+
+
+def split_dataset(base_dir, n_residents, test_ratio):
+    folders = sorted(
+        d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))
+    )[:n_residents]
+
+    train, test = [], []
+    for label, folder in enumerate(folders):
+        images = load_folder(os.path.join(base_dir, folder))
+        n_test = max(1, int(len(images) * test_ratio))
+        test += [(img, label) for img in images[-n_test:]]
+        train += [(img, label) for img in images[:-n_test]]
+    return train, test, len(folders)
+
+
+def bench_lbph(train, test):
+    faces, labels = [], []
+    for img, label in train:
+        faces.append(img)
+        labels.append(label)
+        for aug in augment_image(img):
+            faces.append(normalize_image(cv2.resize(aug, (FACE_SIZE, FACE_SIZE))))
+            labels.append(label)
+
+    model = cv2.face.LBPHFaceRecognizer_create()
+    start = time.perf_counter()
+    model.train(faces, np.array(labels))
+    train_s = time.perf_counter() - start
+
+    hits, elapsed = 0, 0.0
+    for img, label in test:
+        start = time.perf_counter()
+        pred, distance = model.predict(img)
+        elapsed += time.perf_counter() - start
+        hits += pred == label and distance < LBPH_THRESHOLD
+    return hits / len(test), 1000 * elapsed / len(test), train_s, len(faces)
+
+
+def bench_sface(net, train, test):
+    backend = SFaceBackend(gallery_path=None, net=net)
+
+    start = time.perf_counter()
+    embeddings = backend.embed([img for img, _ in train])
+    backend.set_gallery(embeddings, np.array([label for _, label in train]))
+    train_s = time.perf_counter() - start
+
+    # Se separa el coste del embedding (constante) del de la búsqueda
+    queries = backend.embed([img for img, _ in test])
+    hits, elapsed = 0, 0.0
+    for q, (_, label) in zip(queries, test):
+        start = time.perf_counter()
+        labels, sims = backend.search(q[None, :], k=1)
+        elapsed += time.perf_counter() - start
+        hits += labels[0, 0] == label and sims[0, 0] >= backend.threshold
+
+    start = time.perf_counter()
+    backend.embed([test[0][0]])
+    embed_ms = 1000 * (time.perf_counter() - start)
+
+    return hits / len(test), 1000 * elapsed / len(test) + embed_ms, train_s, len(train)
+
+
+def run(base_dir, sizes, test_ratio, model_path):
+    net = load_sface(model_path) if os.path.exists(model_path) else None
+    if net is None:
+        print(f"[WARNING] {model_path} no existe, solo se evalúa LBPH")
+
+    print(f"\n{'='*78}")
+    print(f"  {'Residentes':>10} {'Backend':>8} {'Muestras':>9} {'Precisión':>10} "
+          f"{'ms/predict':>11} {'Entreno (s)':>12}")
+    print(f"{'='*78}")
+
+    last_n = 0
+    for size in sizes:
+        train, test, n = split_dataset(base_dir, size, test_ratio)
+        if not test or n == last_n:
+            break
+        last_n = n
+
+        acc, ms, train_s, samples = bench_lbph(train, test)
+        print(f"  {n:>10} {'lbph':>8} {samples:>9} {acc:>10.1%} {ms:>11.2f} {train_s:>12.2f}")
+
+        if net is not None:
+            acc, ms, train_s, samples = bench_sface(net, train, test)
+            print(f"  {n:>10} {'sface':>8} {samples:>9} {acc:>10.1%} {ms:>11.2f} {train_s:>12.2f}")
+
+    print(f"{'='*78}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LBPH vs SFace")
+    parser.add_argument("dataset", nargs="?", default="dataset")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[5, 10, 20, 50, 100, 200])
+    parser.add_argument("--test-ratio", type=float, default=0.2)
+    parser.add_argument("--model", default=SFACE_MODEL)
+    args = parser.parse_args()
+
+    run(args.dataset, args.sizes, args.test_ratio, args.model)
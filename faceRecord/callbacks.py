@@ -31,7 +31,7 @@ def add_residente_grabando_callback(name_entry):
             return
 
         # 2. ✅ Extraer caras al dataset
-        extract_faces(video_path, nombre)
+        extract_faces(video_path, nombre, show=True)
 
         # 3. ✅ Registrar en Supabase y obtener ID REAL
         real_id = add_residente(nombre)
@@ -68,7 +68,7 @@ def add_residente_subiendo_callback(name_entry):
             return
 
         # 2. ✅ Extraer caras al dataset
-        extract_faces(video_path, nombre)
+        extract_faces(video_path, nombre, show=True)
 
         # 3. ✅ Registrar en Supabase y obtener ID REAL
         real_id = add_residente(nombre)
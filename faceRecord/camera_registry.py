@@ -0,0 +1,198 @@
+# microservicio/camera_registry.py
+"""
+Registro de cámaras del microservicio.
+
+Cada cámara (índice local, archivo o URL) tiene su propio CameraPipeline y
+su propio CameraRecognizer (tracker, cooldowns, FaceMesh); todas comparten
+el modelo cargado en main.py. Cada cámara son hilos (no procesos), así que
+el límite es configurable (variable de entorno MAX_CAMERAS) y los hilos
+internos de OpenCV se reparten entre las cámaras activas.
+"""
+import os
+import threading
+import time
+
+import cv2
+
+from main import CameraRecognizer
+from stream_pipeline import CameraPipeline
+
+MAX_CAMERAS = int(os.environ.get("MAX_CAMERAS", "8"))
+DEFAULT_CAMERA_ID = "0"
+
+
+def parse_source(source):
+    """'0' / 0 -> índice de cámara local; cualquier otra cosa -> archivo o URL."""
+    if isinstance(source, int):
+        return source
+    source = str(source).strip()
+    return int(source) if source.isdigit() else source
+
+
+class Camera:
+    def __init__(self, camera_id, source, log_event):
+        self.id = camera_id
+        self.source = parse_source(source)
+        self._log_event = log_event
+
+        self.cap = None
+        self.pipeline = None
+        self.recognizer = CameraRecognizer(camera_id)
+        self.lock = threading.Lock()
+
+    def log_event(self, message, level="info"):
+        self._log_event(f"[Cámara {self.id}] {message}", level)
+
+    @property
+    def active(self):
+        return self.pipeline is not None and self.pipeline.running
+
+    # ------------------------------------------
+    #   CICLO DE VIDA
+    # ------------------------------------------
+    def start(self):
+        """Abre la fuente y arranca el pipeline. Devuelve (ok, mensaje)."""
+        with self.lock:
+            if self.active:
+                return True, "La cámara ya está activa"
+
+            # ✅ Liberar cámara anterior si existe
+            self._release()
+
+            self.cap = cv2.VideoCapture(self.source)
+
+            # ✅ Dar tiempo a la cámara para inicializar
+            time.sleep(0.5)
+
+            if not self.cap.isOpened():
+                self.log_event("❌ No se pudo abrir la cámara", "error")
+                self.cap = None
+                return False, "No se pudo abrir la cámara"
+
+            # ✅ Verificar que pueda leer frames
+            ret, _ = self.cap.read()
+            if not ret:
+                self.log_event("❌ La cámara se abrió pero no puede leer frames", "error")
+                self._release()
+                return False, "La cámara no puede capturar frames"
+
+            # ✅ Captura, reconocimiento y codificación en hilos separados
+            self.pipeline = CameraPipeline(self.cap, self.process, self.log_event)
+            self.pipeline.start()
+
+            self.log_event("✅ Cámara iniciada correctamente", "success")
+            return True, "Cámara iniciada"
+
+    def stop(self):
+        with self.lock:
+            self._release()
+            self.log_event("🔓 Cámara detenida", "warning")
+
+    def _release(self):
+        # ✅ Detener hilos antes de liberar la cámara
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    # ------------------------------------------
+    #   INFERENCIA
+    # ------------------------------------------
+    def process(self, frame, log_event):
+        """Etapa de inferencia del pipeline: procesa el frame y reporta cada 60."""
+        processed = self.recognizer.process_frame(frame, log_event)
+
+        # Log cada 60 frames (2 segundos aprox)
+        frame_count = self.pipeline.processed + 1
+        if frame_count % 60 == 0:
+            stats = self.recognizer.tracking_stats()
+            log_event(
+                f"📊 Frame {frame_count} procesado correctamente "
+                f"(re-detección: {stats['redetect_rate']:.0%}, tracks: {stats['active_tracks']})",
+                "info"
+            )
+
+        return processed
+
+    def status(self):
+        is_opened = self.cap.isOpened() if self.cap is not None else False
+        return {
+            "id": self.id,
+            "source": self.source,
+            "active": self.active,
+            "camera_opened": is_opened,
+            "message": "Cámara activa" if self.active else "Cámara inactiva",
+            "tracking": self.recognizer.tracking_stats(),
+            "recognition": self.recognizer.recognition_stats(),
+            "pipeline": self.pipeline.stats() if self.pipeline is not None else None,
+        }
+
+
+class CameraRegistry:
+    def __init__(self, log_event, max_cameras=MAX_CAMERAS):
+        self.log_event = log_event
+        self.max_cameras = max_cameras
+        self._cameras = {}
+        self._lock = threading.Lock()
+
+    def add(self, camera_id, source):
+        with self._lock:
+            if camera_id in self._cameras:
+                raise ValueError(f"La cámara '{camera_id}' ya existe")
+            if len(self._cameras) >= self.max_cameras:
+                raise ValueError(f"Máximo de cámaras alcanzado ({self.max_cameras})")
+            return self._insert(camera_id, source)
+
+    def _insert(self, camera_id, source):
+        # Llamar con self._lock tomado
+        camera = Camera(camera_id, source, self.log_event)
+        self._cameras[camera_id] = camera
+        return camera
+
+    def get(self, camera_id):
+        return self._cameras.get(camera_id)
+
+    def get_or_add(self, camera_id, source):
+        """Búsqueda + alta atómicas (ValueError si el registro está lleno)."""
+        with self._lock:
+            camera = self._cameras.get(camera_id)
+            if camera is not None:
+                return camera
+            if len(self._cameras) >= self.max_cameras:
+                raise ValueError(f"Máximo de cámaras alcanzado ({self.max_cameras})")
+            return self._insert(camera_id, source)
+
+    def remove(self, camera_id):
+        with self._lock:
+            camera = self._cameras.pop(camera_id, None)
+        if camera is not None:
+            camera.stop()
+        self.balance_threads()
+        return camera is not None
+
+    def list(self):
+        return list(self._cameras.values())
+
+    def start(self, camera_id):
+        camera = self.get(camera_id)
+        if camera is None:
+            return False, f"La cámara '{camera_id}' no existe"
+        ok, message = camera.start()
+        self.balance_threads()
+        return ok, message
+
+    def stop(self, camera_id):
+        camera = self.get(camera_id)
+        if camera is None:
+            return False, f"La cámara '{camera_id}' no existe"
+        camera.stop()
+        self.balance_threads()
+        return True, "Cámara detenida"
+
+    def balance_threads(self):
+        """Reparte los hilos internos de OpenCV entre las cámaras activas."""
+        active = sum(1 for c in self._cameras.values() if c.active)
+        cv2.setNumThreads(max(1, (os.cpu_count() or 1) // max(1, active)))
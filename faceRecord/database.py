@@ -1,10 +1,45 @@
+import atexit
 import datetime
 import numpy as np
 from config import SUPABASE_URL, SUPABASE_KEY
 from supabase import create_client
+from postgrest.exceptions import APIError
+
+from event_writer import AccessEventWriter
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+
+def _insert_accesos(rows):
+    """Inserta un lote de accesos en una sola petición."""
+    supabase.table("accesos").insert(rows).execute()
+
+
+# HTTP que no dependen de la fila: credenciales, timeout, rate limit
+TRANSIENT_HTTP = {401, 403, 408, 429}
+
+
+def is_data_rejection(exc):
+    """
+    True solo si Supabase rechazó los DATOS de forma determinista: SQLSTATE
+    22xxx (dato inválido) / 23xxx (restricción, ej. FK) o un 4xx de HTTP que
+    no sea de credenciales/espera. postgrest lanza APIError también con 5xx,
+    JWT vencido (PGRST301) o caídas; eso es un corte y se reintenta.
+    """
+    if not isinstance(exc, APIError):
+        return False
+    code = str(exc.code or "")
+    if len(code) == 5 and code[:2] in ("22", "23"):
+        return True
+    # Respuesta sin JSON: postgrest pone el status HTTP como código
+    return code.isdigit() and 400 <= int(code) < 500 and int(code) not in TRANSIENT_HTTP
+
+
+# Los accesos se escriben en segundo plano (spool SQLite + lotes)
+event_writer = AccessEventWriter(_insert_accesos, is_rejection=is_data_rejection)
+event_writer.start()
+atexit.register(event_writer.stop)
+
 # ==========================================
 # RESIDENTES
 # ==========================================
@@ -61,8 +96,8 @@ def registrar_acceso(residente_id, tipo, imagen_url=None):
         "imagen_url": imagen_url
     }
 
-    supabase.table("accesos").insert(data).execute()
-    print(f"[Supabase] ACCESO → {residente_id} | {tipo} | {fecha} {hora}")
+    event_writer.enqueue(data)
+    print(f"[Supabase] ACCESO (en cola) → {residente_id} | {tipo} | {fecha} {hora}")
 
 
 # ==========================================
@@ -82,8 +117,18 @@ def registrar_desconocido(tipo, imagen_url=None):
         "imagen_url": imagen_url
     }
 
-    supabase.table("accesos").insert(data).execute()
-    print(f"[Supabase] DESCONOCIDO → {tipo} | {fecha} {hora}")
+    event_writer.enqueue(data)
+    print(f"[Supabase] DESCONOCIDO (en cola) → {tipo} | {fecha} {hora}")
+
+
+def get_event_writer_metrics():
+    """Profundidad de la cola y latencia de envío de los accesos."""
+    return event_writer.metrics()
+
+
+def requeue_dead_events(ids=None):
+    """Devuelve a la cola los accesos descartados (todos o los IDs dados)."""
+    return event_writer.requeue_dead(ids)
 
 
 # ==========================================
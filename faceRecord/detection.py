@@ -0,0 +1,51 @@
+# microservicio/detection.py
+"""
+Detección Haar multi-resolución.
+
+El cascade se ejecuta sobre una versión reducida de la imagen en grises y
+las cajas se devuelven en coordenadas de la resolución completa, de modo
+que el reconocimiento sigue recortando del frame original.
+"""
+import cv2
+
+# Tamaño mínimo de rostro (px a resolución completa). El cascade usa una
+# ventana base de 24x24, así que a escala s el mínimo efectivo es 24/s.
+MIN_FACE_SIZE = 60
+HAAR_WINDOW = 24
+
+
+def load_cascade():
+    return cv2.CascadeClassifier(
+        cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    )
+
+
+face_cascade = load_cascade()
+
+
+def detect_faces(gray, scale=1.0, min_size=MIN_FACE_SIZE, cascade=None,
+                 scale_factor=1.1, min_neighbors=5):
+    """
+    Detecta rostros sobre `gray` reducido por `scale` (1.0, 0.5, 0.25...).
+
+    Returns:
+        lista de cajas (x, y, w, h) en coordenadas de `gray`
+    """
+    cascade = cascade or face_cascade
+
+    if scale >= 1.0:
+        small = gray
+        scale = 1.0
+    else:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    side = max(HAAR_WINDOW, int(min_size * scale))
+    faces = cascade.detectMultiScale(
+        small, scale_factor, min_neighbors, minSize=(side, side)
+    )
+
+    inv = 1.0 / scale
+    return [
+        (int(x * inv), int(y * inv), int(w * inv), int(h * inv))
+        for (x, y, w, h) in faces
+    ]
@@ -0,0 +1,296 @@
+# microservicio/event_writer.py
+"""
+Escritor asíncrono de eventos de acceso.
+
+Los eventos se guardan primero en un spool SQLite local (modo WAL), de modo
+que sobreviven a reinicios y caídas de red, y un hilo en segundo plano los
+inserta en Supabase por lotes cuando se alcanza BATCH_SIZE eventos o cuando
+el más antiguo lleva FLUSH_INTERVAL segundos esperando.
+
+Si Supabase rechaza un lote por los datos (ej. FK de un residente borrado)
+se reintenta fila por fila: las válidas se insertan y las rechazadas suman
+un intento; tras MAX_ATTEMPTS rechazos pasan a la tabla `dead` para no
+frenar al resto. Después de un rechazo el escritor también espera con
+backoff. Cualquier otro error (red, 5xx, credenciales) no cuenta como
+intento: el lote entero espera con backoff.
+
+Devolver a la cola los eventos descartados (con el servicio parado o no):
+    python event_writer.py --dead             # lista la tabla dead
+    python event_writer.py --requeue          # todos
+    python event_writer.py --requeue 3 7      # solo esos IDs
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+
+SPOOL_PATH = "event_spool.db"
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 2.0       # segundos
+MAX_BACKOFF = 60.0         # segundos entre reintentos si Supabase falla
+MAX_ATTEMPTS = 3           # rechazos de una fila antes de pasarla a `dead`
+
+
+class AccessEventWriter:
+    """
+    Args:
+        insert_fn: función que inserta una lista de filas (lanza excepción si falla)
+        spool_path: archivo SQLite para los eventos pendientes
+        is_rejection: exc -> True si el servidor rechazó los datos (error
+            determinista de la fila, no un corte). Por defecto ningún error
+            es rechazo: todo se reintenta con backoff.
+    """
+
+    def __init__(self, insert_fn, spool_path=SPOOL_PATH,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, is_rejection=None):
+        self.insert_fn = insert_fn
+        self.is_rejection = is_rejection or (lambda exc: False)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._db = sqlite3.connect(spool_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pending (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(pending)")]
+        if "attempts" not in columns:   # spool creado por una versión anterior
+            self._db.execute("ALTER TABLE pending ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS dead (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL,
+                failed REAL NOT NULL,
+                error TEXT
+            )
+        """)
+        self._db.commit()
+        self._db_lock = threading.Lock()
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # Métricas
+        self.enqueued = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.last_error = None
+
+    # ------------------------------------------
+    #   API PÚBLICA
+    # ------------------------------------------
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, event):
+        """Guarda el evento en el spool y despierta al escritor si hay lote."""
+        with self._db_lock:
+            self._db.execute(
+                "INSERT INTO pending (payload, created) VALUES (?, ?)",
+                (json.dumps(event), time.time()),
+            )
+            self._db.commit()
+        self.enqueued += 1
+
+        self.start()
+        if self.pending() >= self.batch_size:
+            self._wake.set()
+
+    def stop(self, flush=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            if self._thread.is_alive():
+                # Sigue dentro de su propio envío: volver a enviar duplicaría filas
+                print("[WARN] El escritor de eventos no terminó; los pendientes quedan en el spool")
+                return
+        if flush:
+            try:
+                while self._flush_batch():
+                    pass
+            except Exception as e:
+                print(f"[ERROR] No se pudieron enviar eventos pendientes: {e}")
+
+    def pending(self):
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def dead(self):
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM dead").fetchone()[0]
+
+    def dead_rows(self):
+        """[(id, payload, failed, error)] de los eventos descartados."""
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT id, payload, failed, error FROM dead ORDER BY id"
+            ).fetchall()
+
+    def requeue_dead(self, ids=None):
+        """Devuelve a pending (con 0 intentos) los eventos de `dead`. Devuelve cuántos."""
+        where, params = "", ()
+        if ids:
+            where = f" WHERE id IN ({','.join('?' * len(ids))})"
+            params = tuple(ids)
+        with self._db_lock:
+            rows = self._db.execute(f"SELECT id, payload, created FROM dead{where}", params).fetchall()
+            self._db.executemany(
+                "INSERT INTO pending (payload, created) VALUES (?, ?)",
+                [(payload, created) for _, payload, created in rows],
+            )
+            self._db.executemany("DELETE FROM dead WHERE id = ?", [(row[0],) for row in rows])
+            self._db.commit()
+        if rows:
+            self._wake.set()
+        return len(rows)
+
+    def metrics(self):
+        return {
+            "pending": self.pending(),
+            "dead": self.dead(),
+            "rejected": self.rejected,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "last_flush_ms": round(self.last_flush_ms, 1),
+            "avg_flush_ms": round(self.total_flush_ms / self.batches, 1) if self.batches else 0.0,
+            "last_error": self.last_error,
+        }
+
+    # ------------------------------------------
+    #   HILO ESCRITOR
+    # ------------------------------------------
+    def _oldest_age(self):
+        with self._db_lock:
+            row = self._db.execute("SELECT MIN(created) FROM pending").fetchone()
+        return time.time() - row[0] if row[0] is not None else None
+
+    def _delete(self, ids):
+        with self._db_lock:
+            self._db.executemany("DELETE FROM pending WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+
+    def _flush_batch(self):
+        """Envía un lote. Devuelve True si sacó algo del spool."""
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id, payload, created, attempts FROM pending ORDER BY id LIMIT ?",
+                (self.batch_size,),
+            ).fetchall()
+        if not rows:
+            return False
+
+        start = time.perf_counter()
+        try:
+            self.insert_fn([json.loads(row[1]) for row in rows])
+        except Exception as e:
+            if not self.is_rejection(e):
+                raise   # corte de red: el lote espera entero
+            self._flush_rows(rows)
+            return True
+        elapsed = (time.perf_counter() - start) * 1000
+
+        self._delete([row[0] for row in rows])
+        self.flushed += len(rows)
+        self.batches += 1
+        self.last_flush_ms = elapsed
+        self.total_flush_ms += elapsed
+        return True
+
+    def _flush_rows(self, rows):
+        """Reintenta un lote rechazado fila por fila."""
+        for row_id, payload, created, attempts in rows:
+            try:
+                self.insert_fn([json.loads(payload)])
+            except Exception as e:
+                if not self.is_rejection(e):
+                    raise
+                self._reject(row_id, payload, created, attempts + 1, e)
+                continue
+            self._delete([row_id])
+            self.flushed += 1
+
+    def _reject(self, row_id, payload, created, attempts, error):
+        self.rejected += 1
+        self.last_error = str(error)
+        with self._db_lock:
+            if attempts >= MAX_ATTEMPTS:
+                self._db.execute(
+                    "INSERT INTO dead (payload, created, failed, error) VALUES (?, ?, ?, ?)",
+                    (payload, created, time.time(), str(error)),
+                )
+                self._db.execute("DELETE FROM pending WHERE id = ?", (row_id,))
+                print(f"[ERROR] Evento descartado tras {attempts} rechazos (tabla dead): {error}")
+            else:
+                self._db.execute("UPDATE pending SET attempts = ? WHERE id = ?", (attempts, row_id))
+            self._db.commit()
+
+    def _run(self):
+        backoff = 1.0
+
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.flush_interval / 2)
+            self._wake.clear()
+
+            age = self._oldest_age()
+            if age is None:
+                continue
+            if self.pending() < self.batch_size and age < self.flush_interval:
+                continue
+
+            rejected = self.rejected
+            try:
+                # Tras un rechazo se corta: las filas rechazadas siguen primeras
+                # en la cola y no deben gastar sus intentos en el mismo instante
+                while (self._flush_batch() and self.rejected == rejected
+                       and self.pending() >= self.batch_size):
+                    pass
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"[ERROR] Supabase no disponible, eventos en spool ({self.pending()}): {e}")
+            else:
+                if self.rejected == rejected:
+                    backoff = 1.0
+                    continue
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Eventos de acceso descartados (tabla dead)")
+    parser.add_argument("--spool", default=SPOOL_PATH)
+    parser.add_argument("--dead", action="store_true", help="lista los eventos descartados")
+    parser.add_argument("--requeue", nargs="*", type=int, metavar="ID",
+                        help="devuelve a la cola los IDs dados (o todos)")
+    args = parser.parse_args()
+
+    # Sin insert_fn: solo se toca el spool; el servicio envía los que vuelven a pending
+    writer = AccessEventWriter(insert_fn=None, spool_path=args.spool)
+    if args.requeue is not None:
+        print(f"✅ {writer.requeue_dead(args.requeue)} eventos devueltos a la cola")
+    else:
+        for row_id, payload, failed, error in writer.dead_rows():
+            print(f"{row_id:>6}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(failed))}  {error}\n        {payload}")
+        print(f"{writer.dead()} eventos descartados, {writer.pending()} pendientes")
\ No newline at end of file
@@ -1,6 +1,12 @@
 import cv2
 import os
+import math
 import numpy as np
+from concurrent.futures import as_completed
+
+from jobs import process_pool
+from packed_dataset import write_packed, PACKED_FACES, PACKED_INDEX
+from face_quality import quality_score, select_faces, CANDIDATE_FACTOR
 
 face_cascade = cv2.CascadeClassifier(
     cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
@@ -8,10 +14,85 @@ face_cascade = cv2.CascadeClassifier(
 
 FACE_SIZE = 200
 
+# Saltos de al menos SEEK_STRIDE frames se hacen con seek por tiempo: FFmpeg
+# salta al keyframe anterior y decodifica solo desde ahí. Saltos menores se
+# recorren con grab(), que avanza sin retrieve() (sin convertir a BGR).
+SEEK_STRIDE = 30
+
+# Videos largos: segmentos por tiempo procesados en paralelo (un proceso por núcleo)
+EXTRACT_WORKERS = os.cpu_count() or 1
+MIN_SEGMENT_FRAMES = 300          # no vale la pena partir menos de ~10 s por segmento
+SEGMENT_OVERSAMPLE = 1.5          # cada segmento junta algo más que su parte de max_faces
+
+
 def ensure_dir(path):
     os.makedirs(path, exist_ok=True)
 
 
+def seek(cap, frame_index, fps):
+    """Posiciona el video en un frame, por tiempo si se conoce el fps."""
+    if fps > 0:
+        return cap.set(cv2.CAP_PROP_POS_MSEC, 1000.0 * frame_index / fps)
+    return cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+
+def frame_targets(total, skip_frames=2, sample_frames=None):
+    """Índices de los frames a analizar en un video de `total` frames."""
+    if sample_frames:
+        return np.unique(np.linspace(0, total - 1, min(sample_frames, total)).astype(int))
+    step = max(1, skip_frames)
+    return np.arange(step - 1, total, step)
+
+
+def iter_frames(cap, skip_frames=2, sample_frames=None, stats=None, targets=None):
+    """
+    Genera (índice, frame) decodificando solo los frames que se van a usar.
+
+    - skip_frames: uno de cada N frames (el N-ésimo, igual que antes).
+    - sample_frames: N frames repartidos uniformemente en todo el video
+      (requiere conocer la cantidad de frames; si no, se usa skip_frames).
+    - targets: lista explícita de índices (la usan los segmentos paralelos).
+    """
+    stats = stats if stats is not None else {}
+    stats.update(grabbed=0, decoded=0, seeks=0)
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+
+    if targets is None and sample_frames and total > 0:
+        targets = frame_targets(total, sample_frames=sample_frames)
+    # targets None: secuencial skip-1, 2·skip-1, ... hasta que se acabe el video
+
+    position = 0   # próximo frame que entregaría read()/grab()
+    step = max(1, skip_frames)
+    i = 0
+    while True:
+        if targets is not None:
+            if i >= len(targets):
+                return
+            target = int(targets[i])
+        else:
+            target = step * (i + 1) - 1
+        i += 1
+
+        gap = target - position
+        if gap >= SEEK_STRIDE and (targets is not None or fps > 0):
+            seek(cap, target, fps)
+            stats["seeks"] += 1
+        else:
+            for _ in range(gap):
+                if not cap.grab():
+                    return
+                stats["grabbed"] += 1
+
+        ret, frame = cap.read()
+        if not ret:
+            return
+        stats["decoded"] += 1
+        position = target + 1
+        yield target, frame
+
+
 def augment_face_conservative(face_img):
     """
     Augmentación CONSERVADORA - Solo variaciones realistas que ayudan a LBPH.
@@ -38,7 +119,146 @@ def augment_face_conservative(face_img):
     return augmented
 
 
-def extract_faces(video_path, nombre, skip_frames=2, max_faces=100, use_augmentation=True, residente_id=None):
+def crop_faces(gray):
+    """
+    Detecta rostros y devuelve (recorte 200×200 ecualizado, calidad). La
+    calidad se mide antes de ecualizar (ver face_quality.quality_score).
+    """
+    faces = face_cascade.detectMultiScale(
+        gray, 
+        scaleFactor=1.1,
+        minNeighbors=5,
+        minSize=(100, 100)
+    )
+
+    crops = []
+    for (x, y, w, h) in faces:
+        # Extraer rostro con pequeño margen (5%)
+        margin = int(w * 0.05)
+        x1 = max(0, x - margin)
+        y1 = max(0, y - margin)
+        x2 = min(gray.shape[1], x + w + margin)
+        y2 = min(gray.shape[0], y + h + margin)
+
+        face_img = gray[y1:y2, x1:x2]
+
+        # Redimensionar
+        face_img = cv2.resize(face_img, (FACE_SIZE, FACE_SIZE))
+        quality = quality_score(face_img, w)
+
+        # Normalizar con ecualización de histograma
+        crops.append((cv2.equalizeHist(face_img), quality))
+    return crops
+
+
+def save_face(output_dir, number, face_img, use_augmentation, packed_faces=None):
+    """Guarda un rostro (y sus augmentaciones). Devuelve las imágenes escritas."""
+    if use_augmentation:
+        # Augmentación conservadora (3 variaciones)
+        images = [
+            (f"{output_dir}/face_{number:04d}_{idx}.jpg", aug_face)
+            for idx, aug_face in enumerate(augment_face_conservative(face_img))
+        ]
+    else:
+        # Sin augmentación
+        images = [(f"{output_dir}/face_{number:04d}.jpg", face_img)]
+
+    for filename, image in images:
+        if packed_faces is not None:
+            packed_faces.append(image)
+        else:
+            cv2.imwrite(filename, image)
+    return len(images)
+
+
+# ============================================
+#   SEGMENTOS EN PARALELO
+# ============================================
+def _extract_segment(args):
+    """Worker: abre el video, salta a sus frames y devuelve (frame, recorte, calidad)."""
+    video_path, targets, quota = args
+
+    cap = cv2.VideoCapture(video_path)
+    stats = {}
+    found = []
+    try:
+        for frame_index, frame in iter_frames(cap, stats=stats, targets=targets):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            for face_img, quality in crop_faces(gray):
+                found.append((frame_index, face_img, quality))
+            if len(found) >= quota:
+                break
+    finally:
+        cap.release()
+    return found[:quota], stats
+
+
+def extract_segments(video_path, targets, max_faces, workers, select_best=True, progress=None,
+                     fill_duplicates=False):
+    """
+    Reparte los frames a analizar en segmentos contiguos (uno por proceso).
+    Cada segmento junta hasta su cuota; al unir se toma por turnos de cada
+    segmento hasta max_faces (así un tramo sin rostros no deja huecos) y se
+    ordena por frame para numerar igual que en modo secuencial.
+
+    Con select_best cada segmento junta CANDIDATE_FACTOR veces más candidatos
+    y la selección por calidad/duplicados se hace sobre todos juntos.
+    """
+    segments = [t for t in np.array_split(targets, workers) if len(t)]
+    wanted = max_faces * CANDIDATE_FACTOR if select_best else max_faces
+    quota = math.ceil(wanted * SEGMENT_OVERSAMPLE / len(segments))
+
+    with process_pool(len(segments)) as pool:
+        futures = [pool.submit(_extract_segment, (video_path, t, quota)) for t in segments]
+        candidates = 0
+        for done, future in enumerate(as_completed(futures), 1):
+            candidates += len(future.result()[0])
+            if progress:
+                progress(segments=f"{done}/{len(segments)}", candidates=candidates)
+        results = [future.result() for future in futures]
+
+    stats = {"grabbed": 0, "decoded": 0, "seeks": 0, "segments": len(segments)}
+    for _, segment_stats in results:
+        for key in ("grabbed", "decoded", "seeks"):
+            stats[key] += segment_stats[key]
+
+    if select_best:
+        selected, selection_stats = select_faces(
+            [item for found, _ in results for item in found], max_faces,
+            fill_duplicates=fill_duplicates,
+        )
+        stats.update(selection_stats)
+    else:
+        selected = []
+        for rank in range(quota):
+            for found, _ in results:
+                if rank < len(found) and len(selected) < max_faces:
+                    selected.append(found[rank])
+        selected.sort(key=lambda item: item[0])
+
+    return [face_img for _, face_img, _ in selected], stats
+
+
+def extract_faces(video_path, nombre, skip_frames=2, max_faces=100, use_augmentation=True, residente_id=None,
+                  packed=False, sample_frames=None, workers=EXTRACT_WORKERS, select_best=True, progress=None,
+                  fill_duplicates=False, capture=None, show=False):
+    """
+    Extrae rostros del video a dataset/<id>_<nombre>.
+
+    packed=True guarda un solo faces.npy (N×200×200) + index.json en lugar de
+    un JPEG por rostro. sample_frames=N analiza N frames repartidos en todo
+    el video en vez de recorrerlo desde el inicio hasta juntar max_faces.
+    Con workers > 1 y un video largo, los segmentos se procesan en paralelo.
+    select_best=True analiza hasta CANDIDATE_FACTOR·max_faces candidatos y
+    guarda los max_faces más nítidos/mejor iluminados sin casi-duplicados
+    (con un video casi estático pueden ser menos; fill_duplicates=True completa
+    hasta max_faces repitiendo los mejores duplicados).
+    progress(**avance), si se pasa, recibe frames analizados y candidatos.
+    capture: VideoCapture ya abierta sobre video_path (se usa y se libera).
+    show=True muestra la vista previa con HighGUI (solo GUI/CLI: HighGUI no es
+    thread-safe y la API corre varias extracciones en hilos sin pantalla).
+    Devuelve la cantidad de imágenes guardadas.
+    """
     # Si quieres guardar por ID:
     if residente_id is not None:
         output_dir = f"dataset/{residente_id}_{nombre}"
@@ -47,96 +267,105 @@ def extract_faces(video_path, nombre, skip_frames=2, max_faces=100, use_augmenta
     
     ensure_dir(output_dir)
 
+    # ✅ Un faces.npy viejo ocultaría los JPEG nuevos
+    if not packed:
+        for name in (PACKED_FACES, PACKED_INDEX):
+            if os.path.exists(os.path.join(output_dir, name)):
+                os.remove(os.path.join(output_dir, name))
+    packed_faces = [] if packed else None
 
-    cap = cv2.VideoCapture(video_path)
+
+    cap = capture if capture is not None else cv2.VideoCapture(video_path)
     
     if not cap.isOpened():
         print(f"[ERROR] No se pudo abrir el video: {video_path}")
-        return
+        return 0
 
-    frame_count = 0
     saved_faces = 0
     total_images = 0
+    frame_stats = {}
 
     print(f"[INFO] Extrayendo rostros para '{nombre}'...")
-    print(f"[INFO] Configuración: max_faces={max_faces}, augmentation={'Sí (conservadora)' if use_augmentation else 'No'}")
+    print(f"[INFO] Configuración: max_faces={max_faces}, augmentation={'Sí (conservadora)' if use_augmentation else 'No'}"
+          + (f", sample_frames={sample_frames}" if sample_frames else f", skip_frames={skip_frames}"))
 
-    while saved_faces < max_faces:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        frame_count += 1
-        
-        # Procesar cada N frames
-        if frame_count % skip_frames != 0:
-            continue
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    segments = min(workers, total_frames // MIN_SEGMENT_FRAMES)
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detectar rostros
-        faces = face_cascade.detectMultiScale(
-            gray, 
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(100, 100)
+    if segments > 1:
+        # ✅ Video largo: cada proceso busca su propio tramo
+        cap.release()
+        targets = frame_targets(total_frames, skip_frames, sample_frames)
+        face_imgs, frame_stats = extract_segments(
+            video_path, targets, max_faces, segments, select_best, progress, fill_duplicates
         )
-
-        for (x, y, w, h) in faces:
-            if saved_faces >= max_faces:
+        print(f"[INFO] {frame_stats['segments']} segmentos procesados en paralelo")
+    else:
+        # Solo se decodifican los frames que se analizan
+        wanted = max_faces * CANDIDATE_FACTOR if select_best else max_faces
+        candidates = []
+        for frame_index, frame in iter_frames(cap, skip_frames, sample_frames, frame_stats):
+            if len(candidates) >= wanted:
                 break
-                
-            # Extraer rostro con pequeño margen (5%)
-            margin = int(w * 0.05)
-            x1 = max(0, x - margin)
-            y1 = max(0, y - margin)
-            x2 = min(gray.shape[1], x + w + margin)
-            y2 = min(gray.shape[0], y + h + margin)
-            
-            face_img = gray[y1:y2, x1:x2]
 
-            # Redimensionar
-            face_img = cv2.resize(face_img, (FACE_SIZE, FACE_SIZE))
-            
-            # Normalizar con ecualización de histograma
-            face_img = cv2.equalizeHist(face_img)
-            
-            saved_faces += 1
-            
-            if use_augmentation:
-                # Augmentación conservadora (3 variaciones)
-                augmented_faces = augment_face_conservative(face_img)
-                
-                for idx, aug_face in enumerate(augmented_faces):
-                    total_images += 1
-                    filename = f"{output_dir}/face_{saved_faces:04d}_{idx}.jpg"
-                    cv2.imwrite(filename, aug_face)
-                    
-                    # Mostrar solo la original
-                    if idx == 0:
-                        cv2.imshow("Capturando", aug_face)
-            else:
-                # Sin augmentación
-                total_images += 1
-                filename = f"{output_dir}/face_{saved_faces:04d}.jpg"
-                cv2.imwrite(filename, face_img)
-                cv2.imshow("Capturando", face_img)
-
-            if cv2.waitKey(1) & 0xFF == 27:  # ESC
-                break
+            if progress:
+                progress(frames=frame_stats["decoded"], candidates=len(candidates))
 
-    cap.release()
-    cv2.destroyAllWindows()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+            for face_img, quality in crop_faces(gray):
+                if len(candidates) >= wanted:
+                    break
+
+                candidates.append((frame_index, face_img, quality))
+
+                # Mostrar solo la original
+                if show:
+                    cv2.imshow("Capturando", face_img)
+                    if cv2.waitKey(1) & 0xFF == 27:  # ESC
+                        break
+
+        cap.release()
+        if show:
+            cv2.destroyWindow("Capturando")
+
+        if select_best:
+            candidates, selection_stats = select_faces(
+                candidates, max_faces, fill_duplicates=fill_duplicates
+            )
+            frame_stats.update(selection_stats)
+        face_imgs = [face_img for _, face_img, _ in candidates]
+
+    for face_img in face_imgs:
+        saved_faces += 1
+        total_images += save_face(output_dir, saved_faces, face_img, use_augmentation, packed_faces)
+
+    if packed and packed_faces:
+        write_packed(
+            output_dir, packed_faces,
+            source="video", residente_id=residente_id, nombre=nombre,
+            augmentation=use_augmentation, base_faces=saved_faces,
+        )
     
     print(f"\n{'='*50}")
     print(f"[✓] Extracción completada para '{nombre}'")
     print(f"{'='*50}")
     print(f"  Rostros base:     {saved_faces}")
     print(f"  Imágenes totales: {total_images}")
+    print(f"  Frames:           {frame_stats['decoded']} decodificados, "
+          f"{frame_stats['grabbed']} saltados con grab(), {frame_stats['seeks']} seeks")
+    if "candidates" in frame_stats:
+        print(f"  Selección:        {frame_stats['candidates']} candidatos, "
+              f"{frame_stats['duplicates']} casi-duplicados descartados, "
+              f"nitidez media {frame_stats['mean_sharpness']:.0f}")
     if use_augmentation and saved_faces > 0:
         print(f"  Ratio augment:    {total_images/saved_faces:.1f}x")
+    if packed:
+        print(f"  Formato:          {PACKED_FACES} (empaquetado)")
     print(f"{'='*50}\n")
 
+    return total_images
+
 
 def extract_faces_interactive(nombre, duration_seconds=20, target_faces=80):
     """
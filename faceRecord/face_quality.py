@@ -0,0 +1,88 @@
+# microservicio/face_quality.py
+"""
+Selección de recortes para el dataset.
+
+Cada recorte recibe un puntaje de calidad (nitidez por varianza del
+Laplaciano, brillo cercano al medio y tamaño del rostro detectado). Luego se
+eligen los mejores N descartando casi-duplicados: dos recortes cuyo dHash
+(64 bits) difiere en pocos bits son prácticamente el mismo frame.
+"""
+import cv2
+import numpy as np
+
+SHARPNESS_TARGET = 150.0   # varianza del Laplaciano considerada "nítida"
+FACE_SIZE_TARGET = 200     # ancho de detección (px) considerado suficiente
+HASH_MIN_DISTANCE = 6      # bits distintos mínimos para no ser duplicado
+CANDIDATE_FACTOR = 3       # candidatos analizados por cada rostro a guardar
+
+
+def quality_score(raw_face, detected_width):
+    """
+    Puntaje en [0, 1] de un recorte en gris ANTES de ecualizar (la
+    ecualización borra las diferencias de brillo y contraste).
+    """
+    sharpness = cv2.Laplacian(raw_face, cv2.CV_64F).var()
+    brightness = raw_face.mean()
+
+    sharp_score = min(1.0, sharpness / SHARPNESS_TARGET)
+    bright_score = 1.0 - abs(brightness - 128.0) / 128.0
+    size_score = min(1.0, detected_width / FACE_SIZE_TARGET)
+    return {
+        "score": sharp_score * bright_score * size_score,
+        "sharpness": sharpness,
+        "brightness": brightness,
+        "size": int(detected_width),
+    }
+
+
+def dhash(face):
+    """Hash perceptual de 64 bits (gradiente horizontal sobre 9×8)."""
+    small = cv2.resize(face, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return np.packbits(bits).view(">u8")[0]
+
+
+def hamming(h, hashes):
+    """Bits distintos entre un hash y un arreglo de hashes."""
+    xor = np.bitwise_xor(hashes, h).astype(">u8")
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def select_faces(candidates, max_faces, min_distance=HASH_MIN_DISTANCE, fill_duplicates=False):
+    """
+    Elige hasta `max_faces` recortes de mejor puntaje sin casi-duplicados.
+    Si no alcanzan (video casi estático) se devuelven menos; con
+    fill_duplicates=True se completa con los mejores duplicados.
+
+    Args:
+        candidates: lista de (frame, recorte ecualizado, calidad)
+    Returns:
+        (seleccionados en orden de frame, estadísticas)
+    """
+    ranked = sorted(candidates, key=lambda c: c[2]["score"], reverse=True)
+
+    selected, duplicates = [], []
+    hashes = np.empty(0, dtype=">u8")
+    for candidate in ranked:
+        if len(selected) >= max_faces:
+            break
+        h = dhash(candidate[1])
+        if len(hashes) and hamming(h, hashes).min() < min_distance:
+            duplicates.append(candidate)
+            continue
+        selected.append(candidate)
+        hashes = np.append(hashes, h)
+
+    # duplicates ya está ordenado por puntaje
+    refill = duplicates[:max_faces - len(selected)] if fill_duplicates else []
+    selected += refill
+
+    selected.sort(key=lambda c: c[0])
+    kept = [c[2] for c in selected]
+    stats = {
+        "candidates": len(candidates),
+        "duplicates": len(duplicates) - len(refill),
+        "mean_sharpness": float(np.mean([q["sharpness"] for q in kept])) if kept else 0.0,
+        "mean_score": float(np.mean([q["score"] for q in kept])) if kept else 0.0,
+    }
+    return selected, stats
@@ -0,0 +1,60 @@
+# microservicio/identity.py
+"""
+Votación de identidad por track.
+
+Cada rostro seguido acumula sus predicciones en una ventana deslizante.
+Mientras la identidad no es estable se predice en cada frame; una vez
+decidida, solo se vuelve a verificar cada `reverify_every` frames.
+"""
+from collections import Counter, deque
+
+UNKNOWN = "__desconocido__"
+
+
+class IdentityVote:
+    """
+    Args:
+        window: tamaño de la ventana de votos
+        min_votes: votos mínimos para aceptar una identidad conocida
+        min_unknown_votes: votos mínimos para declarar desconocido
+        agreement: fracción de la ventana que debe coincidir
+        reverify_every: frames entre verificaciones una vez decidido
+    """
+
+    def __init__(self, window=15, min_votes=5, min_unknown_votes=15,
+                 agreement=0.7, reverify_every=30):
+        self.votes = deque(maxlen=window)
+        self.min_votes = min_votes
+        self.min_unknown_votes = min_unknown_votes
+        self.agreement = agreement
+        self.reverify_every = reverify_every
+
+        self.decision = None          # None = analizando
+        self.reported = False         # ya se emitió el evento de esta decisión
+        self.frames_since_predict = 0
+
+    def needs_prediction(self):
+        if self.decision is None:
+            return True
+        return self.frames_since_predict >= self.reverify_every
+
+    def tick(self):
+        """Avanza un frame sin predicción."""
+        self.frames_since_predict += 1
+
+    def add(self, key):
+        """Agrega un voto (clave de residente o UNKNOWN) y recalcula la decisión."""
+        self.votes.append(key)
+        self.frames_since_predict = 0
+
+        top, count = Counter(self.votes).most_common(1)[0]
+        required = self.min_unknown_votes if top == UNKNOWN else self.min_votes
+
+        if count >= required and count / len(self.votes) >= self.agreement:
+            decision = top
+        else:
+            decision = None
+
+        if decision != self.decision:
+            self.decision = decision
+            self.reported = False
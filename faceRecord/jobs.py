@@ -0,0 +1,188 @@
+# microservicio/jobs.py
+"""
+Trabajos en segundo plano del microservicio (generar dataset, entrenar).
+
+Los endpoints encolan el trabajo y responden de inmediato con su ID; un pool
+de hilos los ejecuta con un presupuesto de núcleos. El avance se publica por
+/events (log_event) y se consulta en GET /jobs/{id}.
+
+Cada trabajo tiene una clave (ej. "dataset:5") y nunca corren dos con la
+misma clave a la vez. Si llega otro mientras el primero está en cola, se une
+a él con los argumentos nuevos (ej. otro video_path). Si el primero ya está
+corriendo, queda UN trabajo de seguimiento que arranca al terminar (ej. un
+reentrenamiento pedido a mitad del anterior); nuevas solicitudes se unen a él.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+
+CPU_BUDGET = os.cpu_count() or 1
+JOB_WORKERS = max(1, min(4, CPU_BUDGET // 2))   # trabajos simultáneos
+JOB_HISTORY = 200                               # trabajos terminados que se recuerdan
+PROGRESS_INTERVAL = 2.0                         # segundos mínimos entre eventos de avance
+
+
+def worker_budget():
+    """Procesos de extracción que le tocan a cada trabajo."""
+    return max(1, CPU_BUDGET // JOB_WORKERS)
+
+
+def init_worker():
+    """
+    Inicializa cada proceso del pool: OpenCV con un solo hilo, porque el
+    paralelismo ya lo dan los procesos (con sus hilos internos, N procesos
+    pedirían N×núcleos hilos).
+    """
+    cv2.setNumThreads(1)
+
+
+def process_pool(workers):
+    """
+    Pool de procesos para extracción y preprocesado. Usa spawn: el
+    microservicio tiene hilos vivos (cámaras, trabajos) y hacer fork de un
+    proceso con hilos no es seguro (locks tomados quedan tomados en el hijo).
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+    )
+
+
+class Job:
+    def __init__(self, kind, key, log_event):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.state = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._log_event = log_event
+        self._last_report = 0.0
+        self._call = None        # (fn, args, kwargs); se reemplaza al unirse otro
+
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    def log_event(self, message, level="info"):
+        self._log_event(f"[Job {self.id}] {message}", level)
+
+    def report(self, force=False, **progress):
+        """Actualiza el avance; se publica como mucho cada PROGRESS_INTERVAL."""
+        self.progress.update(progress)
+        now = time.monotonic()
+        if force or now - self._last_report >= PROGRESS_INTERVAL:
+            self._last_report = now
+            detail = ", ".join(f"{k}={v}" for k, v in self.progress.items())
+            self.log_event(f"⏳ {self.kind}: {detail}")
+
+    def status(self):
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "key": self.key,
+            "state": self.state,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.created_at)),
+            "elapsed": round(end - (self.started_at or end), 1),
+        }
+
+
+class JobManager:
+    def __init__(self, log_event, workers=JOB_WORKERS):
+        self.log_event = log_event
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}          # id -> Job (en orden de creación)
+        self._by_key = {}        # clave -> Job activo
+        self._follow_up = {}     # clave -> Job que espera a que termine el activo
+        self._lock = threading.Lock()
+
+    def submit(self, kind, key, fn, *args, **kwargs):
+        """
+        Encola fn(job, *args, **kwargs). Devuelve (job, merged); merged es True
+        si se unió a un trabajo en cola con la misma clave (que ahora corre
+        con estos argumentos).
+        """
+        with self._lock:
+            waiting = self._follow_up.get(key)
+            if waiting is None:
+                active = self._by_key.get(key)
+                if active is not None and active.state == "queued":
+                    waiting = active
+            if waiting is not None:
+                waiting._call = (fn, args, kwargs)
+                return waiting, True
+
+            job = Job(kind, key, self.log_event)
+            job._call = (fn, args, kwargs)
+            self._jobs[job.id] = job
+            self._prune()
+            running = self._by_key.get(key)
+            after = running is not None and running.active
+            if after:
+                # Arranca cuando termine el que está corriendo (ver _run)
+                self._follow_up[key] = job
+            else:
+                self._by_key[key] = job
+                self._pool.submit(self._run, job)
+
+        job.log_event(f"📥 {kind} en cola ({key}{', tras el que está corriendo' if after else ''})")
+        return job, False
+
+    def _run(self, job):
+        with self._lock:
+            # Desde aquí un submit con la misma clave ya no cambia los argumentos
+            fn, args, kwargs = job._call
+            job.state = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.state = "success"
+            job.log_event(f"✅ {job.kind} terminado en {time.time() - job.started_at:.1f} s", "success")
+        except Exception as e:
+            job.error = str(e)
+            job.state = "error"
+            job.log_event(f"❌ {job.kind} falló: {e}", "error")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
+                    follow_up = self._follow_up.pop(job.key, None)
+                    if follow_up is not None:
+                        self._by_key[job.key] = follow_up
+                        self._pool.submit(self._run, follow_up)
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if not j.active]
+        for job in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self):
+        jobs = self.list()
+        return {
+            "workers": self.workers,
+            "queued": sum(j.state == "queued" for j in jobs),
+            "running": sum(j.state == "running" for j in jobs),
+        }
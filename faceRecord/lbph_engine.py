@@ -0,0 +1,328 @@
+# microservicio/lbph_engine.py
+"""
+Motor LBPH propio en NumPy, compatible con cv2.face.LBPHFaceRecognizer.
+
+- Los histogramas de todas las muestras viven en UNA matriz contigua N×D de
+  conteos enteros (uint16 por defecto: exacto y 2× menos RAM que los
+  float32 de OpenCV). uint8 ahorra 4× pero satura los conteos en 255 (en la
+  galería y en la consulta): en zonas planas la distancia deja de ser la de
+  OpenCV y LBPH_THRESHOLD no significa lo mismo.
+- Los histogramas (de la galería y de cada consulta) los calcula cv2.face,
+  así coinciden bit a bit con los de face_model.xml.
+- Las distancias chi-cuadrado (HISTCMP_CHISQR_ALT, la que usa OpenCV) de
+  todas las muestras y de todos los rostros del frame se calculan en una
+  sola pasada vectorizada, por bloques para acotar la memoria.
+
+Para conteos a, b (celdas de A píxeles):
+
+    chi2_alt = 2/A · Σ (a-b)²/(a+b) = 2/A · (Σa + Σb - 4·Σ ab/(a+b))
+
+y ab/(a+b) solo es distinto de cero donde ambos conteos lo son, así que
+basta recorrer las columnas no nulas de las consultas.
+
+Formato binario (face_model.lbph), cargado con memory-map:
+
+    magic "LBPHNP\0\0" | versión uint32 | largo del encabezado uint32
+    encabezado JSON (parámetros, dtype, N, tabla label -> residente)
+    labels int32[N] | sumas por fila float32[N] | histogramas dtype[N×D]
+
+Cada bloque empieza alineado a 64 bytes.
+
+Convertir un face_model.xml existente (una sola vez):
+    python lbph_engine.py face_model.xml face_model.lbph
+"""
+import argparse
+import json
+import os
+import struct
+import time
+
+import cv2
+import numpy as np
+
+FACE_SIZE = 200
+CHUNK_BYTES = 32 * 1024 * 1024   # memoria de trabajo por bloque de muestras
+TRAIN_CHUNK = 256                # rostros por bloque al calcular histogramas
+
+MAGIC = b"LBPHNP\0\0"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGN = 64
+
+
+class LBPHEngine:
+    def __init__(self, radius=1, neighbors=8, grid_x=8, grid_y=8,
+                 face_size=FACE_SIZE, dtype=np.uint16):
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.face_size = face_size
+        self.dtype = np.dtype(dtype)
+        self.max_count = np.iinfo(self.dtype).max
+
+        self.patterns = 2 ** neighbors
+        side = face_size - 2 * radius
+        self.cell_w = side // grid_x
+        self.cell_h = side // grid_y
+        self.cell_area = self.cell_w * self.cell_h
+        self.dim = grid_x * grid_y * self.patterns
+
+        self.histograms = np.empty((0, self.dim), dtype=self.dtype)
+        self.labels = np.empty(0, dtype=np.int32)
+        self.label_names = {}            # label -> ID de residente (labels.txt)
+        self._row_sums = np.empty(0, dtype=np.float32)
+        self._starts = np.empty(0, dtype=np.intp)
+        self._label_keys = np.empty(0, dtype=np.int32)
+
+    # ------------------------------------------
+    #   LBP + HISTOGRAMA ESPACIAL (de cv2.face)
+    # ------------------------------------------
+    def histogram_counts(self, faces):
+        """
+        Conteos por celda (Q×D, int32): histograma espacial sin normalizar.
+
+        Los calcula el mismo cv2.face que entrena face_model.xml. Reescribir
+        el LBP en NumPy no da lo mismo bit a bit: según cómo se compiló
+        OpenCV (FMA/SIMD) el valor interpolado de un vecino cae un ulp del
+        otro lado del centro en zonas planas, y galería (from_opencv) y
+        consulta terminarían en celdas distintas.
+        """
+        model = cv2.face.LBPHFaceRecognizer_create(
+            self.radius, self.neighbors, self.grid_x, self.grid_y
+        )
+        model.train(
+            [np.ascontiguousarray(face, dtype=np.uint8) for face in faces],
+            np.zeros(len(faces), dtype=np.int32),
+        )
+        # cv2 normaliza cada celda por su área: se vuelve al conteo entero
+        hists = np.asarray(model.getHistograms(), dtype=np.float32).reshape(len(faces), self.dim)
+        return np.rint(hists * self.cell_area).astype(np.int32)
+
+    # ------------------------------------------
+    #   GALERÍA
+    # ------------------------------------------
+    def _store(self, counts):
+        return np.minimum(counts, self.max_count).astype(self.dtype)
+
+    def saturation(self):
+        """Fracción de celdas de la galería que llegaron al máximo del dtype."""
+        if not len(self.labels):
+            return 0.0
+        return float(np.mean(self.histograms == self.max_count))
+
+    def compute_histograms(self, faces):
+        """Conteos N×D ya en el dtype de la galería, por bloques de TRAIN_CHUNK rostros."""
+        out = np.empty((len(faces), self.dim), dtype=self.dtype)
+        for start in range(0, len(faces), TRAIN_CHUNK):
+            out[start:start + TRAIN_CHUNK] = self._store(
+                self.histogram_counts(faces[start:start + TRAIN_CHUNK])
+            )
+        return out
+
+    def set_samples(self, histograms, labels):
+        """Reemplaza la galería con conteos N×D (se ordenan por label)."""
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        order = np.argsort(labels, kind="stable")
+        self.histograms = np.ascontiguousarray(self._store(np.asarray(histograms)[order]))
+        self.labels = labels[order]
+        self._index()
+
+    def _index(self):
+        self._row_sums = self.histograms.sum(axis=1, dtype=np.float32)
+        self._label_keys, self._starts = np.unique(self.labels, return_index=True)
+
+    def train(self, faces, labels):
+        self.set_samples(self.compute_histograms(faces), labels)
+
+    def update(self, faces, labels):
+        self.set_samples(
+            np.concatenate([self.histograms, self.compute_histograms(faces)]),
+            np.concatenate([self.labels, np.asarray(labels, dtype=np.int32).ravel()]),
+        )
+
+    def remove_label(self, label):
+        """Descarta todas las muestras de un label (para reemplazar a un residente)."""
+        keep = self.labels != label
+        self.histograms = np.ascontiguousarray(self.histograms[keep])
+        self.labels = self.labels[keep]
+        self._index()
+
+    @classmethod
+    def from_opencv(cls, model, dtype=np.uint16, face_size=FACE_SIZE):
+        """Convierte un LBPHFaceRecognizer entrenado (histogramas normalizados) a conteos."""
+        engine = cls(model.getRadius(), model.getNeighbors(), model.getGridX(), model.getGridY(),
+                     face_size=face_size, dtype=dtype)
+        histograms = model.getHistograms()
+        counts = np.empty((len(histograms), engine.dim), dtype=engine.dtype)
+        for i, hist in enumerate(histograms):
+            counts[i] = engine._store(np.rint(hist.ravel() * engine.cell_area))
+        engine.set_samples(counts, model.getLabels())
+        return engine
+
+    @property
+    def nbytes(self):
+        return self.histograms.nbytes
+
+    def __len__(self):
+        return len(self.labels)
+
+    # ------------------------------------------
+    #   BÚSQUEDA
+    # ------------------------------------------
+    def distances(self, faces):
+        """Distancias chi-cuadrado (escala de OpenCV) Q×N contra todas las muestras."""
+        # Misma saturación que la galería: si no, una celda plana (>255 píxeles
+        # con el mismo patrón) suma distancia contra la propia muestra
+        query = np.minimum(self.histogram_counts(faces), self.max_count)
+        cols = np.flatnonzero(query.any(axis=0))
+        q = query[:, cols].astype(np.float32)                  # Q×U
+        q_sums = query.sum(axis=1, dtype=np.float32)
+
+        n = len(self.labels)
+        out = np.empty((len(q), n), dtype=np.float32)
+        chunk = max(1, CHUNK_BYTES // (4 * len(q) * max(1, len(cols))))
+
+        for start in range(0, n, chunk):
+            h = self.histograms[start:start + chunk][:, cols].astype(np.float32)   # C×U
+            prod = h[None] * q[:, None]                                          # Q×C×U
+            # Conteos enteros: si la suma es 0 el producto también lo es
+            prod /= np.maximum(h[None] + q[:, None], 1)
+            shared = prod.sum(axis=2)
+            out[:, start:start + chunk] = (
+                q_sums[:, None] + self._row_sums[None, start:start + chunk] - 4 * shared
+            )
+
+        np.maximum(out, 0, out=out)
+        out *= 2.0 / self.cell_area
+        return out
+
+    def search(self, faces, k=1):
+        """
+        Top-k residentes (mínima distancia por label) para cada rostro.
+
+        Returns:
+            (labels Q×k, distancias Q×k) de menor a mayor distancia
+        """
+        per_label = np.minimum.reduceat(self.distances(faces), self._starts, axis=1)   # Q×R
+
+        k = min(k, per_label.shape[1])
+        top = np.argpartition(per_label, k - 1, axis=1)[:, :k]
+        top_dist = np.take_along_axis(per_label, top, axis=1)
+        order = np.argsort(top_dist, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return self._label_keys[top], np.take_along_axis(top_dist, order, axis=1)
+
+    def predict(self, face):
+        labels, dists = self.search([face], k=1)
+        return int(labels[0, 0]), float(dists[0, 0])
+
+    # ------------------------------------------
+    #   FORMATO BINARIO
+    # ------------------------------------------
+    def save(self, path):
+        """Escribe el modelo en formato binario (reemplazo atómico)."""
+        header = json.dumps({
+            "radius": self.radius,
+            "neighbors": self.neighbors,
+            "grid_x": self.grid_x,
+            "grid_y": self.grid_y,
+            "face_size": self.face_size,
+            "dtype": self.dtype.name,
+            "samples": len(self.labels),
+            "dim": self.dim,
+            "label_names": {str(k): v for k, v in self.label_names.items()},
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }, ensure_ascii=False).encode("utf-8")
+        offsets = _layout(len(header), len(self.labels))
+
+        root, ext = os.path.splitext(path)
+        tmp = f"{root}.tmp{ext}"
+        with open(tmp, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            f.write(header)
+            _write_at(f, offsets["labels"], self.labels.astype(np.int32))
+            _write_at(f, offsets["row_sums"], self._row_sums.astype(np.float32))
+            f.seek(offsets["histograms"])
+            for start in range(0, len(self.labels), TRAIN_CHUNK):
+                self.histograms[start:start + TRAIN_CHUNK].tofile(f)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Abre un modelo binario. Con mmap=True los histogramas no se leen al
+        cargar: el sistema operativo trae las páginas al buscar.
+        """
+        with open(path, "rb") as f:
+            magic, version, header_len = PREAMBLE.unpack(f.read(PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} no es un modelo LBPH binario")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Versión de modelo no soportada: {version}")
+            header = json.loads(f.read(header_len).decode("utf-8"))
+
+        n, dim = header["samples"], header["dim"]
+        offsets = _layout(header_len, n)
+        engine = cls(header["radius"], header["neighbors"], header["grid_x"], header["grid_y"],
+                     face_size=header["face_size"], dtype=header["dtype"])
+        if engine.dim != dim:
+            raise ValueError(f"Dimensión inconsistente en {path}: {dim} != {engine.dim}")
+
+        engine.labels = np.fromfile(path, dtype=np.int32, count=n, offset=offsets["labels"])
+        engine._row_sums = np.fromfile(path, dtype=np.float32, count=n, offset=offsets["row_sums"])
+        if mmap and n > 0:
+            engine.histograms = np.memmap(path, dtype=engine.dtype, mode="r",
+                                          offset=offsets["histograms"], shape=(n, dim))
+        else:
+            engine.histograms = np.fromfile(path, dtype=engine.dtype, count=n * dim,
+                                            offset=offsets["histograms"]).reshape(n, dim)
+        engine.label_names = {int(k): v for k, v in header["label_names"].items()}
+        engine._label_keys, engine._starts = np.unique(engine.labels, return_index=True)
+        return engine
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _layout(header_len, n):
+    labels = _align(PREAMBLE.size + header_len)
+    row_sums = _align(labels + 4 * n)
+    return {"labels": labels, "row_sums": row_sums, "histograms": _align(row_sums + 4 * n)}
+
+
+def _write_at(f, offset, array):
+    f.seek(offset)
+    array.tofile(f)
+
+
+def convert_xml(xml_path, out_path, labels_path=None, dtype=np.uint16):
+    """Convierte un face_model.xml de OpenCV (y su labels.txt) al formato binario."""
+    model = cv2.face.LBPHFaceRecognizer_create()
+    model.read(xml_path)
+    engine = LBPHEngine.from_opencv(model, dtype=dtype)
+
+    if labels_path and os.path.exists(labels_path):
+        with open(labels_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if ":" in line:
+                    label, name = line.strip().split(":", 1)
+                    engine.label_names[int(label)] = name
+
+    return engine.save(out_path), engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convierte face_model.xml al formato binario")
+    parser.add_argument("xml", nargs="?", default="face_model.xml")
+    parser.add_argument("out", nargs="?", default="face_model.lbph")
+    parser.add_argument("--labels", default="labels.txt")
+    parser.add_argument("--dtype", choices=["uint8", "uint16"], default="uint16")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path, engine = convert_xml(args.xml, args.out, args.labels, dtype=args.dtype)
+    print(f"✅ {args.xml} → {path}: {len(engine)} muestras, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB ({time.perf_counter() - start:.1f} s)")
@@ -7,17 +7,24 @@ import json
 import os
 
 from database import registrar_acceso, registrar_desconocido
+from detection import detect_faces as detect_faces_scaled, load_cascade, MIN_FACE_SIZE
+from tracking import FaceTracker, clip_box
+from identity import IdentityVote, UNKNOWN
+from recognizers import load_recognizer, LBPH_MODEL, LBPH_BINARY, SFACE_GALLERY, LABEL_FILES
+from model_store import ModelStore
 
-# --- Inicializar mediapipe ---
+# --- Mediapipe (una instancia de FaceMesh por cámara) ---
 mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1)
 
-# --- Cargar el modelo 1 sola vez ---
-face_recognizer = cv2.face.LBPHFaceRecognizer_create()
-face_recognizer.read('face_model.xml')
+# --- Modelo compartido por todas las cámaras ---
+# "lbph" / "lbph_np" (face_model.xml) o "sface" (embeddings, face_gallery.npz)
+RECOGNIZER_BACKEND = "lbph"
+LABELS_FILE = LABEL_FILES[RECOGNIZER_BACKEND][0]   # labels.txt para "lbph"
+MAPPING_FILE = "mapping.json"
+MODEL_FILES = {"lbph": LBPH_MODEL, "lbph_np": LBPH_BINARY, "sface": SFACE_GALLERY}
 
-# --- Cargar labels una vez ---
-def load_labels(filename='labels.txt'):
+# --- Cargar labels ---
+def load_labels(filename=LABELS_FILE):
     labels = {}
     with open(filename, 'r') as f:
         for line in f.readlines():
@@ -25,8 +32,8 @@ def load_labels(filename='labels.txt'):
             labels[int(label)] = name
     return labels
 
-# --- Cargar mapping una vez ---
-def load_mapping(filename='mapping.json'):
+# --- Cargar mapping ---
+def load_mapping(filename=MAPPING_FILE):
     if not os.path.exists(filename):
         print(f"[WARNING] {filename} no existe, usando labels directos")
         return {}
@@ -38,24 +45,69 @@ def load_mapping(filename='mapping.json'):
         print(f"[ERROR] No se pudo cargar {filename}: {e}")
         return {}
 
-labels = load_labels()
-mapping = load_mapping()  # ← Cargar mapping.json
 
-# --- Detector de caras Haar ---
-face_cascade = cv2.CascadeClassifier(
-    cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+def load_model_artifacts():
+    """Carga modelo + labels + mapping (se ejecuta también en cada recarga)."""
+    recognizer = load_recognizer(RECOGNIZER_BACKEND)
+    # El modelo binario trae su propia tabla label -> residente
+    labels = getattr(recognizer, "label_names", None) or load_labels()
+    return recognizer, labels, load_mapping()
+
+
+# --- Se carga al importar y se recarga en caliente tras entrenar ---
+model_store = ModelStore(
+    load_model_artifacts,
+    watch_files=[MODEL_FILES[RECOGNIZER_BACKEND], LABELS_FILE, MAPPING_FILE],
 )
 
+
+def reload_model(reason="manual"):
+    """Recarga el modelo en segundo plano sin detener las cámaras."""
+    return model_store.reload_async(reason)
+
+# --- Detector de caras Haar (multi-resolución) ---
+# Se detecta sobre el frame reducido y las cajas se mapean a resolución
+# completa; el reconocimiento sigue recortando del frame original.
+DETECTION_SCALE = 0.5   # 1.0 = completa, 0.5 = 1/2, 0.25 = 1/4
+
+# --- Modo de seguimiento (detect-then-track) ---
+# "track": detecta cada DETECT_EVERY_N frames y sigue los rostros entre medio
+# "detect": detección Haar completa en cada frame (comportamiento original)
+TRACKING_MODE = "track"
+DETECT_EVERY_N = 10
+TRACK_MIN_CONFIDENCE = 0.5
+
 # ============================================
 #   PROCESA UN SOLO FRAME (INTEGRACIÓN STREAM)
 # ============================================
-last_marked = {}
-unknown_frames = 0
-last_unknown_time = 0
-
 FACE_SIZE = 200
 UNKNOWN_FRAMES_REQUIRED = 15
 UNKNOWN_DELAY = 20  # segundos
+ACCESS_COOLDOWN = 60  # segundos entre accesos del mismo residente
+
+# --- Votación de identidad por track ---
+VOTE_WINDOW = 20
+VOTES_REQUIRED = 5
+VOTE_AGREEMENT = 0.7
+REVERIFY_EVERY_N = 30  # frames entre predicciones una vez decidida la identidad
+
+# --- FaceMesh sobre el ROI del track ---
+MESH_PADDING = 0.25          # margen alrededor de la caja (fracción del tamaño)
+DIRECTION_RETRY_N = 5        # frames entre intentos si aún no hay dirección
+DIRECTION_REFRESH_N = 15     # frames entre refrescos hasta registrar el evento
+
+
+def get_identity(track):
+    """Devuelve (creando si hace falta) el estado de votación del track."""
+    if track.identity is None:
+        track.identity = IdentityVote(
+            window=VOTE_WINDOW,
+            min_votes=VOTES_REQUIRED,
+            min_unknown_votes=UNKNOWN_FRAMES_REQUIRED,
+            agreement=VOTE_AGREEMENT,
+            reverify_every=REVERIFY_EVERY_N,
+        )
+    return track.identity
 
 
 def get_face_direction(frame, face_landmarks):
@@ -70,12 +122,13 @@ def get_face_direction(frame, face_landmarks):
     return "Entrando" if left_x < right_x else "Saliendo"
 
 
-def get_real_id(label_name):
+def get_real_id(label_name, mapping=None):
     """
     Convierte el nombre del label al ID real de Supabase usando mapping.json
     
     Args:
         label_name: Nombre desde labels.txt (ej: "Carlos", "5", "DESCONOCIDO_Carlos")
+        mapping: mapping del modelo en uso (por defecto el cargado actualmente)
     
     Returns:
         int o None: ID real de Supabase o None si no es válido
@@ -86,6 +139,9 @@ def get_real_id(label_name):
     except (ValueError, TypeError):
         pass
     
+    if mapping is None:
+        mapping = model_store.current.mapping
+
     # ✅ Caso 2: Buscar en mapping.json (sistema antiguo)
     if label_name in mapping:
         try:
@@ -99,88 +155,257 @@ def get_real_id(label_name):
     return None
 
 
-def process_frame_with_logger(frame, log_event=None):
+class CameraRecognizer:
     """
-    Procesa un frame con logging opcional
+    Estado de reconocimiento de UNA cámara: detector, tracker, FaceMesh,
+    cooldowns y estadísticas. El modelo, labels y mapping se comparten.
     """
-    global unknown_frames, last_unknown_time
 
-    if log_event is None:
-        log_event = lambda msg, level="info": print(f"[{level.upper()}] {msg}")
+    def __init__(self, camera_id="0"):
+        self.camera_id = camera_id
+
+        # Cascade y FaceMesh no son seguros entre hilos: uno por cámara
+        self.cascade = load_cascade()
+        self.face_mesh = mp_face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1)
+
+        self.detection_scale = DETECTION_SCALE
+        self.tracker = FaceTracker(
+            self.detect_faces,
+            detect_every=DETECT_EVERY_N if TRACKING_MODE == "track" else 1,
+            min_confidence=TRACK_MIN_CONFIDENCE,
+        )
+
+        self.last_marked = {}
+        self.last_unknown_time = 0
+        self.stats = {"face_frames": 0, "predictions": 0, "mesh_runs": 0}
+
+    def detect_faces(self, gray):
+        return detect_faces_scaled(
+            gray, scale=self.detection_scale, min_size=MIN_FACE_SIZE, cascade=self.cascade
+        )
+
+    # ------------------------------------------
+    #   CONFIGURACIÓN / ESTADÍSTICAS
+    # ------------------------------------------
+    @property
+    def tracking_mode(self):
+        return "detect" if self.tracker.detect_every == 1 else "track"
+
+    def configure_tracking(self, mode=None, detect_every=None, detection_scale=None):
+        """
+        Aplica solo los campos recibidos (None = sin cambios). Todo se valida
+        antes de tocar nada, así un valor inválido no deja la cámara a medias.
+        """
+        if mode is not None and mode not in ("track", "detect"):
+            raise ValueError(f"Modo de seguimiento inválido: {mode}")
+        if detect_every is not None and detect_every < 1:
+            raise ValueError(f"detect_every inválido: {detect_every}")
+        if detection_scale is not None and not 0 < detection_scale <= 1:
+            raise ValueError(f"Escala de detección inválida: {detection_scale}")
+
+        if mode is not None or detect_every is not None:
+            if detect_every is None and self.tracking_mode == "track":
+                detect_every = self.tracker.detect_every
+            self.set_tracking_mode(mode or self.tracking_mode, detect_every)
+        if detection_scale is not None:
+            self.set_detection_scale(detection_scale)
+
+    def set_tracking_mode(self, mode, detect_every=None):
+        """Cambia el modo de seguimiento en caliente ("track" o "detect")."""
+        if mode not in ("track", "detect"):
+            raise ValueError(f"Modo de seguimiento inválido: {mode}")
+        if mode == "detect":
+            self.tracker.detect_every = 1
+        else:
+            self.tracker.detect_every = max(2, int(detect_every or DETECT_EVERY_N))
+        self.tracker.reset()
+
+    def set_detection_scale(self, scale):
+        """Cambia la escala de detección en caliente (0 < scale <= 1)."""
+        if not 0 < scale <= 1:
+            raise ValueError(f"Escala de detección inválida: {scale}")
+        self.detection_scale = scale
+
+    def tracking_stats(self):
+        """Frecuencia de re-detección para ajustar latencia vs CPU."""
+        return {**self.tracker.stats(), "detection_scale": self.detection_scale}
+
+    def recognition_stats(self):
+        """Predicciones realizadas frente a rostros procesados."""
+        faces = self.stats["face_frames"]
+        return {
+            **self.stats,
+            "predict_ratio": round(self.stats["predictions"] / faces, 3) if faces else 0.0,
+        }
+
+    # ------------------------------------------
+    #   DIRECCIÓN (FaceMesh)
+    # ------------------------------------------
+    def update_direction(self, frame, track):
+        """
+        Ejecuta FaceMesh solo sobre el recorte del track y solo cuando hace falta:
+        al aparecer, reintentando si no hubo landmarks, y a baja cadencia hasta
+        que el evento del track se haya registrado.
+        """
+        if track.direction_age is not None:
+            elapsed = track.age - track.direction_age
+            if track.direction == "NoDetectado":
+                if elapsed < DIRECTION_RETRY_N:
+                    return track.direction
+            elif track.identity is not None and track.identity.reported:
+                return track.direction
+            elif elapsed < DIRECTION_REFRESH_N:
+                return track.direction
+
+        x, y, w, h = track.box
+        pad_x, pad_y = int(w * MESH_PADDING), int(h * MESH_PADDING)
+        x, y, w, h = clip_box((x - pad_x, y - pad_y, w + 2 * pad_x, h + 2 * pad_y), frame.shape)
+        track.direction_age = track.age
+        if w == 0 or h == 0:
+            return track.direction
+
+        rgb = cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2RGB)
+        result = self.face_mesh.process(rgb)
+        self.stats["mesh_runs"] += 1
+
+        if result.multi_face_landmarks:
+            track.direction = get_face_direction(rgb, result.multi_face_landmarks[0])
+
+        return track.direction
+
+    # ------------------------------------------
+    #   FRAME
+    # ------------------------------------------
+    def process_frame(self, frame, log_event=None):
+        """
+        Procesa un frame con logging opcional
+        """
+        if log_event is None:
+            log_event = lambda msg, level="info": print(f"[{level.upper()}] {msg}")
+
+        # El frame entero usa el modelo vigente al empezar (recarga atómica)
+        model = model_store.current
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        tracks = self.tracker.update(gray)
+
+        # Dirección sobre el ROI de cada rostro, antes de dibujar sobre el frame
+        # (FaceMesh no se ejecuta en frames sin rostros)
+        for track in tracks:
+            self.update_direction(frame, track)
+
+        current_time = time.time()
+
+        # Solo se predice mientras la identidad no es estable o toca re-verificar;
+        # todos los rostros del frame van al reconocedor en un solo lote
+        pending, faces = [], []
+        for track in tracks:
+            x, y, w, h = clip_box(track.box, gray.shape)
+            if w == 0 or h == 0:
+                continue
+
+            self.stats["face_frames"] += 1
+            vote = get_identity(track)
+
+            if vote.needs_prediction():
+                face = gray[y:y+h, x:x+w]
+                faces.append(cv2.resize(face, (FACE_SIZE, FACE_SIZE)))
+                pending.append(vote)
+            else:
+                vote.tick()
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.1, 5)
+        if faces:
+            results = model.recognizer.predict_batch(faces)
+            self.stats["predictions"] += len(faces)
 
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    result = face_mesh.process(rgb)
-    direction = "NoDetectado"
+            for vote, (label, score, accepted) in zip(pending, results):
+                if accepted and label in model.labels:
+                    vote.add(model.labels[label])
+                else:
+                    vote.add(UNKNOWN)
 
-    if result.multi_face_landmarks:
-        direction = get_face_direction(frame, result.multi_face_landmarks[0])
+        for track in tracks:
+            x, y, w, h = clip_box(track.box, gray.shape)
+            if w == 0 or h == 0:
+                continue
 
-    current_time = time.time()
+            vote = get_identity(track)
 
-    for (x, y, w, h) in faces:
-        face = gray[y:y+h, x:x+w]
-        face_resized = cv2.resize(face, (FACE_SIZE, FACE_SIZE))
+            direction = track.direction
 
-        label, confidence = face_recognizer.predict(face_resized)
+            # ===== ANALIZANDO =====
+            if vote.decision is None:
+                cv2.putText(frame, "Analizando...", (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+
+            # ===== DESCONOCIDO =====
+            elif vote.decision == UNKNOWN:
+                if not vote.reported:
+                    vote.reported = True
+                    if current_time - self.last_unknown_time > UNKNOWN_DELAY:
+                        registrar_desconocido(direction)
+                        self.last_unknown_time = current_time
+                        log_event(f"Persona desconocida detectada - {direction}", "warning")
+
+                cv2.putText(frame, "Desconocido", (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
 
-        # ===== RECONOCIDO =====
-        if confidence < 60:
-            unknown_frames = 0
+            # ===== RECONOCIDO =====
+            else:
+                label_name = vote.decision
 
-            if label in labels:
-                label_name = labels[label]
-                
                 # ✅ Convertir label a ID real usando mapping
-                residente_id_real = get_real_id(label_name)
-                
+                residente_id_real = get_real_id(label_name, model.mapping)
+
                 # Nombre para mostrar en pantalla
                 if residente_id_real is not None:
                     nombre = f"ID: {residente_id_real}"
                 else:
                     nombre = str(label_name)
-            else:
-                residente_id_real = None
-                nombre = "Desconocido?"
-
-            # ✅ Registrar acceso solo si tenemos ID real válido
-            if residente_id_real is not None:
-                if current_time - last_marked.get(residente_id_real, 0) > 60:
-                    registrar_acceso(residente_id_real, direction)
-                    last_marked[residente_id_real] = current_time
-                    log_event(f"Acceso registrado: Residente {residente_id_real} - {direction}", "success")
-            else:
-                # Persona reconocida pero sin ID válido
-                if current_time - last_marked.get(label_name, 0) > 60:
-                    log_event(f"Persona reconocida sin ID válido: {label_name} - {direction}", "warning")
-                    last_marked[label_name] = current_time
 
-            cv2.putText(frame, nombre, (x, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+                if not vote.reported:
+                    vote.reported = True
 
-        # ===== DESCONOCIDO =====
-        else:
-            unknown_frames += 1
+                    # ✅ Registrar acceso solo si tenemos ID real válido
+                    if residente_id_real is not None:
+                        if current_time - self.last_marked.get(residente_id_real, 0) > ACCESS_COOLDOWN:
+                            registrar_acceso(residente_id_real, direction)
+                            self.last_marked[residente_id_real] = current_time
+                            log_event(f"Acceso registrado: Residente {residente_id_real} - {direction}", "success")
+                    else:
+                        # Persona reconocida pero sin ID válido
+                        if current_time - self.last_marked.get(label_name, 0) > ACCESS_COOLDOWN:
+                            log_event(f"Persona reconocida sin ID válido: {label_name} - {direction}", "warning")
+                            self.last_marked[label_name] = current_time
 
-            if unknown_frames >= UNKNOWN_FRAMES_REQUIRED:
-                if current_time - last_unknown_time > UNKNOWN_DELAY:
-                    registrar_desconocido(direction)
-                    last_unknown_time = current_time
-                    log_event(f"Persona desconocida detectada - {direction}", "warning")
+                cv2.putText(frame, nombre, (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
 
-                cv2.putText(frame, "Desconocido", (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-            else:
-                cv2.putText(frame, "Analizando...", (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
 
-        cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
+        return frame
 
-    return frame
+
+# ============================================
+#   API DE MÓDULO (una sola cámara, compatibilidad)
+# ============================================
+_default_recognizer = None
+
+
+def get_default_recognizer():
+    global _default_recognizer
+    if _default_recognizer is None:
+        _default_recognizer = CameraRecognizer("0")
+    return _default_recognizer
+
+
+def process_frame_with_logger(frame, log_event=None):
+    """
+    Procesa un frame con logging opcional
+    """
+    return get_default_recognizer().process_frame(frame, log_event)
 
 
 def process_frame(frame):
     """Versión original sin logging (por si se usa en otro lugar)"""
-    return process_frame_with_logger(frame, log_event=None)
\ No newline at end of file
+    return process_frame_with_logger(frame, log_event=None)
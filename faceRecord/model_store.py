@@ -0,0 +1,121 @@
+# microservicio/model_store.py
+"""
+Recarga en caliente del modelo de reconocimiento.
+
+El modelo, labels y mapping viajan juntos en un ModelBundle inmutable. La
+recarga construye el bundle nuevo en un hilo aparte y luego reemplaza la
+referencia en una sola asignación: los frames en curso terminan con el
+bundle que tomaron al empezar y los siguientes usan el nuevo, sin pausar
+el stream.
+"""
+import os
+import threading
+import time
+
+WATCH_INTERVAL = 2.0   # segundos entre revisiones de los archivos
+
+
+class ModelBundle:
+    def __init__(self, recognizer, labels, mapping, version):
+        self.recognizer = recognizer
+        self.labels = labels
+        self.mapping = mapping
+        self.version = version
+        self.loaded_at = time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ModelStore:
+    """
+    Args:
+        loader: función () -> (recognizer, labels, mapping)
+        watch_files: archivos cuyo cambio dispara una recarga
+    """
+
+    def __init__(self, loader, watch_files):
+        self.loader = loader
+        self.watch_files = list(watch_files)
+        self.log_event = lambda msg, level="info": print(f"[{level.upper()}] {msg}")
+
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._mtimes = self._read_mtimes()
+        self.last_error = None
+
+        self.current = ModelBundle(*loader(), version=1)
+
+    # ------------------------------------------
+    #   RECARGA
+    # ------------------------------------------
+    def reload(self, reason="manual"):
+        """Carga el modelo nuevo y lo publica. Devuelve True si tuvo éxito."""
+        with self._reload_lock:
+            mtimes = self._read_mtimes()
+            start = time.perf_counter()
+            try:
+                bundle = ModelBundle(*self.loader(), version=self.current.version + 1)
+            except Exception as e:
+                self.last_error = str(e)
+                self.log_event(f"❌ No se pudo recargar el modelo ({reason}): {e}", "error")
+                return False
+
+            # Intercambio atómico: una sola asignación de referencia
+            self.current = bundle
+            self._mtimes = mtimes
+            self.last_error = None
+
+            elapsed = (time.perf_counter() - start) * 1000
+            self.log_event(
+                f"🔄 Modelo recargado v{bundle.version} ({reason}, {elapsed:.0f} ms)", "success"
+            )
+            return True
+
+    def reload_async(self, reason="manual"):
+        thread = threading.Thread(target=self.reload, args=(reason,), name="model-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        return {
+            "version": self.current.version,
+            "loaded_at": self.current.loaded_at,
+            "labels": len(self.current.labels),
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "last_error": self.last_error,
+        }
+
+    # ------------------------------------------
+    #   OBSERVADOR DE ARCHIVOS
+    # ------------------------------------------
+    def start_watcher(self, interval=WATCH_INTERVAL):
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="model-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def _read_mtimes(self):
+        return {
+            path: os.path.getmtime(path) if os.path.exists(path) else None
+            for path in self.watch_files
+        }
+
+    def _watch(self, interval):
+        pending = None
+        while True:
+            time.sleep(interval)
+            mtimes = self._read_mtimes()
+
+            if mtimes == self._mtimes:
+                pending = None
+                continue
+
+            # Esperar a que los archivos dejen de cambiar (entrenamiento en curso)
+            if mtimes != pending:
+                pending = mtimes
+                continue
+
+            pending = None
+            if not self.reload("archivos actualizados"):
+                # No reintentar hasta que vuelvan a cambiar
+                self._mtimes = mtimes
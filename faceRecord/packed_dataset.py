@@ -0,0 +1,152 @@
+# microservicio/packed_dataset.py
+"""
+Formato empaquetado del dataset.
+
+En lugar de cientos de JPEG por residente, cada carpeta guarda:
+
+    dataset/5_Carlos/faces.npy    arreglo uint8 N×200×200 (sin pérdida)
+    dataset/5_Carlos/index.json   metadatos (cantidad, forma, origen, ...)
+
+Las caras se guardan ya redimensionadas y ecualizadas (igual que las usa
+train_model), así que faces.npy se abre con memory-map: entrenar no
+decodifica nada y solo se leen del disco las páginas que se usan.
+
+Convertir el dataset existente:
+    python packed_dataset.py ./dataset            # conserva los JPEG
+    python packed_dataset.py ./dataset --remove   # borra los JPEG convertidos
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+PACKED_FACES = "faces.npy"
+PACKED_INDEX = "index.json"
+FACE_SIZE = 200
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def is_packed(folder_path):
+    return os.path.exists(os.path.join(folder_path, PACKED_FACES))
+
+
+def write_packed(folder_path, faces, **meta):
+    """
+    Guarda las caras (lista o arreglo N×H×W uint8) y su índice. Se ecualizan
+    aquí (las variantes de brillo de la augmentación llegan sin ecualizar),
+    así faces.npy queda igual a lo que entrena train_model.
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    faces = np.asarray(faces, dtype=np.uint8).reshape(-1, FACE_SIZE, FACE_SIZE)
+    faces = np.stack([cv2.equalizeHist(face) for face in faces]) if len(faces) else faces
+
+    faces_path = os.path.join(folder_path, PACKED_FACES)
+    tmp = os.path.join(folder_path, "faces.tmp.npy")
+    np.save(tmp, faces)
+    os.replace(tmp, faces_path)
+
+    index = {
+        "count": int(faces.shape[0]),
+        "shape": list(faces.shape[1:]),
+        "dtype": "uint8",
+        "equalized": True,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        **meta,
+    }
+    with open(os.path.join(folder_path, PACKED_INDEX), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+
+    return faces_path
+
+
+def load_packed(folder_path, mmap=True):
+    """Arreglo N×200×200 de la carpeta (memory-map de solo lectura por defecto)."""
+    return np.load(os.path.join(folder_path, PACKED_FACES), mmap_mode="r" if mmap else None)
+
+
+def load_index(folder_path):
+    path = os.path.join(folder_path, PACKED_INDEX)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def image_files(folder_path):
+    return sorted(
+        name for name in os.listdir(folder_path)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def read_faces(folder_path):
+    """
+    Caras en gris de una carpeta en cualquiera de los dos formatos. Si está
+    empaquetada devuelve el memory-map; si no, decodifica los JPEG.
+    """
+    if is_packed(folder_path):
+        return load_packed(folder_path)
+
+    faces = []
+    for name in image_files(folder_path):
+        image = cv2.imread(os.path.join(folder_path, name), cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            faces.append(image)
+    return faces
+
+
+# ============================================
+#   CONVERSIÓN DESDE CARPETAS DE JPEG
+# ============================================
+def convert_folder(folder_path, remove=False):
+    """Empaqueta los JPEG de una carpeta. Devuelve la cantidad de caras."""
+    names = image_files(folder_path)
+    faces = []
+    for name in names:
+        image = cv2.imread(os.path.join(folder_path, name), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            continue
+        if image.shape != (FACE_SIZE, FACE_SIZE):
+            image = cv2.resize(image, (FACE_SIZE, FACE_SIZE))
+        faces.append(image)   # write_packed ecualiza
+
+    if not faces:
+        return 0
+
+    write_packed(folder_path, faces, source="jpeg", files=names)
+
+    if remove:
+        for name in names:
+            os.remove(os.path.join(folder_path, name))
+
+    return len(faces)
+
+
+def convert_dataset(base_dir, remove=False):
+    folders = sorted(
+        d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))
+    )
+    total = 0
+    for folder in folders:
+        folder_path = os.path.join(base_dir, folder)
+        if is_packed(folder_path):
+            print(f"[PACK] {folder}: ya empaquetada")
+            continue
+        count = convert_folder(folder_path, remove=remove)
+        total += count
+        print(f"[PACK] {folder}: {count} caras → {PACKED_FACES}")
+
+    print(f"✅ Dataset empaquetado: {len(folders)} carpetas, {total} caras")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convierte el dataset de JPEG al formato empaquetado")
+    parser.add_argument("dataset", nargs="?", default="dataset")
+    parser.add_argument("--remove", action="store_true", help="borrar los JPEG convertidos")
+    args = parser.parse_args()
+
+    convert_dataset(args.dataset, remove=args.remove)
@@ -0,0 +1,183 @@
+# microservicio/recognizers.py
+"""
+Backends de reconocimiento intercambiables.
+
+- "lbph":    cv2.face LBPH (compara contra cada histograma de entrenamiento)
+- "lbph_np": LBPH con el motor NumPy de lbph_engine.py (histogramas uint16
+             contiguos, chi-cuadrado vectorizado) y modelo binario
+             face_model.lbph abierto con memory-map
+- "sface":   embeddings de 128 dimensiones con SFace vía cv2.dnn y búsqueda
+             vectorizada en una galería NumPy (un solo producto de matrices)
+
+Todos exponen predict(face_gray) -> (label, score, accepted) y
+predict_batch(faces) -> [(label, score, accepted), ...] para todos los
+rostros de un frame.
+"""
+import os
+
+import cv2
+import numpy as np
+
+from lbph_engine import LBPHEngine, convert_xml
+
+LBPH_MODEL = "face_model.xml"
+LBPH_BINARY = "face_model.lbph"
+LBPH_THRESHOLD = 60           # distancia máxima para aceptar
+
+# Modelo ONNX de OpenCV Zoo:
+# https://github.com/opencv/opencv_zoo/tree/main/models/face_recognition_sface
+SFACE_MODEL = "face_recognition_sface_2021dec.onnx"
+SFACE_GALLERY = "face_gallery.npz"
+SFACE_THRESHOLD = 0.363       # similitud coseno mínima (valor recomendado por OpenCV)
+SFACE_INPUT = (112, 112)
+
+# Cada backend tiene su propio espacio de labels (labels.txt + label_index):
+# entrenar uno no puede cambiar los nombres con los que predice otro modelo
+# ya publicado. LBPH conserva los nombres de archivo históricos.
+LABEL_FILES = {
+    "lbph": ("labels.txt", "label_index.json"),
+    "lbph_np": ("labels_lbph_np.txt", "label_index_lbph_np.json"),
+    "sface": ("labels_sface.txt", "label_index_sface.json"),
+}
+
+
+class LBPHBackend:
+    name = "lbph"
+
+    def __init__(self, model_path=LBPH_MODEL, threshold=LBPH_THRESHOLD):
+        self.threshold = threshold
+        self.model = cv2.face.LBPHFaceRecognizer_create()
+        self.model.read(model_path)
+
+    def predict(self, face):
+        label, distance = self.model.predict(face)
+        return label, distance, distance < self.threshold
+
+    def predict_batch(self, faces):
+        return [self.predict(face) for face in faces]
+
+
+# Windows no deja reemplazar (os.replace) un archivo mapeado en memoria: el
+# entrenamiento no podría publicar face_model.lbph mientras el servicio lo
+# usa. Ahí el modelo se lee entero a RAM; en Linux/macOS se mapea.
+LBPH_MMAP = os.name != "nt"
+
+
+class LBPHNumpyBackend:
+    """
+    Modelo binario con memory-map (ver LBPH_MMAP): cargar no lee los
+    histogramas. Si solo existe face_model.xml se convierte una vez y se usa
+    el binario.
+    """
+    name = "lbph_np"
+
+    def __init__(self, model_path=LBPH_BINARY, threshold=LBPH_THRESHOLD, xml_path=LBPH_MODEL):
+        self.threshold = threshold
+        if not os.path.exists(model_path) and os.path.exists(xml_path):
+            print(f"[INFO] {model_path} no existe, convirtiendo {xml_path} (una sola vez)...")
+            convert_xml(xml_path, model_path, labels_path=LABEL_FILES["lbph"][0])
+        self.engine = LBPHEngine.load(model_path, mmap=LBPH_MMAP)
+
+    @property
+    def label_names(self):
+        return self.engine.label_names
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+    def predict_batch(self, faces):
+        labels, dists = self.engine.search(faces, k=1)
+        return [
+            (int(label), float(dist), dist < self.threshold)
+            for label, dist in zip(labels[:, 0], dists[:, 0])
+        ]
+
+
+class SFaceBackend:
+    """
+    La galería guarda un embedding normalizado por muestra, ordenado por label.
+    Una consulta calcula Q×N similitudes con un producto de matrices y reduce
+    por residente con np.maximum.reduceat.
+    """
+    name = "sface"
+
+    def __init__(self, gallery_path=SFACE_GALLERY, model_path=SFACE_MODEL,
+                 threshold=SFACE_THRESHOLD, net=None):
+        self.threshold = threshold
+        self.net = net if net is not None else load_sface(model_path)
+
+        if gallery_path is not None:
+            data = np.load(gallery_path)
+            self.set_gallery(data["embeddings"], data["labels"])
+
+    def set_gallery(self, embeddings, labels):
+        order = np.argsort(labels, kind="stable")
+        self.embeddings = np.ascontiguousarray(embeddings[order], dtype=np.float32)
+        labels = np.asarray(labels)[order]
+
+        # Inicio de cada residente dentro de la matriz ordenada
+        self.resident_labels, self.starts = np.unique(labels, return_index=True)
+
+    def embed(self, faces):
+        return embed_faces(self.net, faces)
+
+    def search(self, embeddings, k=1):
+        """
+        Top-k residentes para cada embedding de consulta.
+
+        Returns:
+            (labels Q×k, similitudes Q×k) ordenados de mayor a menor similitud
+        """
+        sims = embeddings @ self.embeddings.T                       # Q×N
+        per_resident = np.maximum.reduceat(sims, self.starts, axis=1)  # Q×R
+
+        k = min(k, per_resident.shape[1])
+        top = np.argpartition(-per_resident, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(per_resident, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return self.resident_labels[top], np.take_along_axis(top_sims, order, axis=1)
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+    def predict_batch(self, faces):
+        labels, sims = self.search(self.embed(faces), k=1)
+        return [
+            (int(label), float(sim), sim >= self.threshold)
+            for label, sim in zip(labels[:, 0], sims[:, 0])
+        ]
+
+
+def load_sface(model_path=SFACE_MODEL):
+    if not os.path.exists(model_path):
+        raise RuntimeError(
+            f"No existe el modelo SFace en {model_path}. "
+            "Descárgalo de OpenCV Zoo (face_recognition_sface_2021dec.onnx)."
+        )
+    return cv2.dnn.readNetFromONNX(model_path)
+
+
+def embed_faces(net, faces):
+    """Embeddings L2-normalizados (N×128) para rostros en gris o BGR."""
+    out = []
+    for face in faces:
+        if face.ndim == 2:
+            face = cv2.cvtColor(face, cv2.COLOR_GRAY2BGR)
+        blob = cv2.dnn.blobFromImage(face, 1.0, SFACE_INPUT, (0, 0, 0), swapRB=True, crop=False)
+        net.setInput(blob)
+        out.append(net.forward().reshape(-1))
+
+    emb = np.asarray(out, dtype=np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+    return emb
+
+
+def load_recognizer(backend="lbph"):
+    if backend == "lbph":
+        return LBPHBackend()
+    if backend == "lbph_np":
+        return LBPHNumpyBackend()
+    if backend == "sface":
+        return SFaceBackend()
+    raise ValueError(f"Backend de reconocimiento desconocido: {backend}")
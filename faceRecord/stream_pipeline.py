@@ -0,0 +1,259 @@
+# microservicio/stream_pipeline.py
+"""
+Pipeline por etapas para el stream de video:
+
+    captura ──▶ inferencia ──▶ codificación JPEG ──▶ FrameHub ──▶ clientes
+
+Cada etapa corre en su propio hilo y se comunica con la siguiente por una
+cola acotada que descarta el elemento más antiguo cuando está llena. Así la
+captura siempre entrega el frame más reciente, el reconocimiento nunca
+espera al cliente y un cliente lento solo pierde frames.
+
+Hay un único pipeline por cámara: cada frame se procesa y se codifica una
+sola vez, y el FrameHub lo reparte a todos los clientes conectados.
+"""
+import queue
+import threading
+import time
+
+import cv2
+
+JPEG_QUALITY = 80
+CAPTURE_QUEUE_SIZE = 1    # solo el último frame capturado
+ENCODE_QUEUE_SIZE = 2
+MAX_READ_ERRORS = 100
+
+
+class DropOldestQueue:
+    """Cola acotada: si está llena, descarta el elemento más antiguo."""
+
+    def __init__(self, maxsize):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._lock:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout=None):
+        """Devuelve el siguiente elemento o None si vence el timeout."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class LatestSlot:
+    """Buzón de un suscriptor: guarda solo el último elemento publicado."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Devuelve el último elemento o None si vence el timeout o se cerró."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self._closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class FrameHub:
+    """Reparte cada JPEG a todos los suscriptores (fan-out)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = set()
+
+    def subscribe(self):
+        slot = LatestSlot()
+        with self._lock:
+            self._slots.add(slot)
+        return slot
+
+    def unsubscribe(self, slot):
+        with self._lock:
+            self._slots.discard(slot)
+        slot.close()
+
+    def publish(self, item):
+        with self._lock:
+            slots = list(self._slots)
+        for slot in slots:
+            slot.put(item)
+
+    def close(self):
+        with self._lock:
+            slots = list(self._slots)
+            self._slots.clear()
+        for slot in slots:
+            slot.close()
+
+    @property
+    def subscribers(self):
+        return len(self._slots)
+
+
+class CameraPipeline:
+    """
+    Args:
+        cap: cv2.VideoCapture ya abierto
+        process_fn: función (frame, log_event) -> frame procesado
+        log_event: función de logging del microservicio
+    """
+
+    def __init__(self, cap, process_fn, log_event):
+        self.cap = cap
+        self.process_fn = process_fn
+        self.log_event = log_event
+
+        self.capture_queue = DropOldestQueue(CAPTURE_QUEUE_SIZE)
+        self.encode_queue = DropOldestQueue(ENCODE_QUEUE_SIZE)
+        self.hub = FrameHub()
+
+        self._stop = threading.Event()
+        self._threads = []
+
+        self.captured = 0
+        self.processed = 0
+        self.encoded = 0
+
+    # ------------------------------------------
+    #   CICLO DE VIDA
+    # ------------------------------------------
+    def start(self):
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="captura", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inferencia", daemon=True),
+            threading.Thread(target=self._encode_loop, name="codificacion", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self.hub.close()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    @property
+    def running(self):
+        return not self._stop.is_set() and any(t.is_alive() for t in self._threads)
+
+    def stats(self):
+        return {
+            "captured": self.captured,
+            "processed": self.processed,
+            "encoded": self.encoded,
+            "dropped_capture": self.capture_queue.dropped,
+            "dropped_encode": self.encode_queue.dropped,
+            "clients": self.hub.subscribers,
+        }
+
+    # ------------------------------------------
+    #   ETAPAS
+    # ------------------------------------------
+    def _capture_loop(self):
+        error_count = 0
+
+        while not self._stop.is_set():
+            success, frame = self.cap.read()
+
+            if not success:
+                error_count += 1
+                if error_count % 30 == 0:  # Log cada 30 errores
+                    self.log_event(f"⚠️ No se pudo leer frame (errores: {error_count})", "warning")
+
+                if error_count > MAX_READ_ERRORS:
+                    self.log_event("❌ Demasiados errores leyendo frames, deteniendo captura", "error")
+                    self._stop.set()
+                    break
+
+                time.sleep(0.01)
+                continue
+
+            error_count = 0
+            self.captured += 1
+            self.capture_queue.put(frame)
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            frame = self.capture_queue.get(timeout=0.1)
+            if frame is None:
+                continue
+
+            try:
+                processed = self.process_fn(frame, self.log_event)
+            except Exception as e:
+                self.log_event(f"❌ Error procesando frame: {str(e)}", "error")
+                continue
+
+            self.processed += 1
+            self.encode_queue.put(processed)
+
+    def _encode_loop(self):
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
+
+        while not self._stop.is_set():
+            frame = self.encode_queue.get(timeout=0.1)
+            if frame is None:
+                continue
+
+            # Sin clientes no hace falta codificar
+            if not self.hub.subscribers:
+                continue
+
+            ret, buffer = cv2.imencode('.jpg', frame, params)
+            if not ret:
+                continue
+
+            self.encoded += 1
+            self.hub.publish(buffer.tobytes())
+
+    # ------------------------------------------
+    #   CLIENTES
+    # ------------------------------------------
+    def frames(self):
+        """Generador de JPEGs para un cliente del stream."""
+        slot = self.hub.subscribe()
+        try:
+            while self.running and not slot.closed:
+                jpeg = slot.get(timeout=0.5)
+                if jpeg is None:
+                    continue
+                yield jpeg
+        finally:
+            self.hub.unsubscribe(slot)
@@ -0,0 +1,238 @@
+# microservicio/tracking.py
+"""
+Seguimiento de rostros entre detecciones (detect-then-track).
+
+La detección Haar completa se ejecuta solo cada N frames o cuando algún
+track pierde confianza. Entre detecciones, cada rostro se sigue con flujo
+óptico piramidal (Lucas-Kanade) sobre puntos característicos de su caja,
+con verificación ida/vuelta para estimar la confianza del seguimiento.
+"""
+import cv2
+import numpy as np
+
+MAX_POINTS_PER_TRACK = 30
+MIN_POINTS_PER_TRACK = 6
+FB_ERROR_MAX = 1.0        # error ida/vuelta máximo (px) para un punto válido
+IOU_MATCH = 0.3           # IoU mínimo para asociar detección ↔ track
+MAX_MISSES = 1            # detecciones seguidas sin match antes de eliminar
+
+LK_PARAMS = dict(
+    winSize=(15, 15),
+    maxLevel=2,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03),
+)
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """Un rostro seguido a lo largo de varios frames."""
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.points = None
+        self.confidence = 1.0
+        self.age = 0          # frames desde que se creó
+        self.misses = 0       # detecciones seguidas sin match
+        self.identity = None  # estado de votación (lo asigna main.py)
+        self.direction = "NoDetectado"
+        self.direction_age = None  # edad del track en la última consulta a FaceMesh
+
+    @property
+    def box(self):
+        return tuple(int(round(v)) for v in self._box)
+
+    @box.setter
+    def box(self, value):
+        # Se guarda en float para no acumular error de redondeo entre frames
+        self._box = tuple(float(v) for v in value)
+
+
+class FaceTracker:
+    """
+    Mantiene los tracks activos y decide cuándo volver a detectar.
+
+    Args:
+        detect_fn: función gray -> lista de cajas (x, y, w, h)
+        detect_every: frames entre detecciones completas (1 = detectar siempre)
+        min_confidence: fracción mínima de puntos válidos para seguir un track
+    """
+
+    def __init__(self, detect_fn, detect_every=10, min_confidence=0.5):
+        self.detect_fn = detect_fn
+        self.detect_every = max(1, int(detect_every))
+        self.min_confidence = min_confidence
+
+        self.tracks = []
+        self.prev_gray = None
+        self.next_id = 1
+        self.frames_since_detect = 0
+
+        # Estadísticas
+        self.frames = 0
+        self.detections = 0
+        self.forced_detections = 0
+
+    def update(self, gray):
+        """Procesa un frame en escala de grises y devuelve los tracks activos."""
+        self.frames += 1
+        self.frames_since_detect += 1
+
+        lost = False
+        if self.detect_every > 1 and self.tracks and self.prev_gray is not None \
+                and self.prev_gray.shape == gray.shape:
+            lost = not self._follow(gray)
+
+        if lost or self.frames_since_detect >= self.detect_every or self.prev_gray is None:
+            if lost:
+                self.forced_detections += 1
+            self._detect(gray)
+
+        for track in self.tracks:
+            track.age += 1
+
+        self.prev_gray = gray
+        return self.tracks
+
+    def stats(self):
+        rate = self.detections / self.frames if self.frames else 0.0
+        return {
+            "mode": "track" if self.detect_every > 1 else "detect",
+            "detect_every": self.detect_every,
+            "frames": self.frames,
+            "detections": self.detections,
+            "forced_detections": self.forced_detections,
+            "redetect_rate": round(rate, 3),
+            "active_tracks": len(self.tracks),
+        }
+
+    def reset(self):
+        self.tracks = []
+        self.prev_gray = None
+        self.frames_since_detect = 0
+
+    # ------------------------------------------
+    #   DETECCIÓN + ASOCIACIÓN
+    # ------------------------------------------
+    def _detect(self, gray):
+        self.detections += 1
+        self.frames_since_detect = 0
+
+        boxes = [tuple(int(v) for v in b) for b in self.detect_fn(gray)]
+        unmatched = list(range(len(boxes)))
+
+        # Asociación voraz por IoU (pocas caras por frame)
+        pairs = sorted(
+            ((iou(t.box, boxes[i]), t, i) for t in self.tracks for i in unmatched),
+            key=lambda p: p[0],
+            reverse=True,
+        )
+        matched_tracks = set()
+        for score, track, i in pairs:
+            if score < IOU_MATCH:
+                break
+            if track.id in matched_tracks or i not in unmatched:
+                continue
+            track.box = boxes[i]
+            track.misses = 0
+            matched_tracks.add(track.id)
+            unmatched.remove(i)
+
+        survivors = []
+        for track in self.tracks:
+            if track.id not in matched_tracks:
+                track.misses += 1
+                if track.misses > MAX_MISSES:
+                    continue
+            survivors.append(track)
+
+        for i in unmatched:
+            survivors.append(Track(self.next_id, boxes[i]))
+            self.next_id += 1
+
+        self.tracks = survivors
+        for track in self.tracks:
+            self._init_points(gray, track)
+
+    def _init_points(self, gray, track):
+        x, y, w, h = clip_box(track.box, gray.shape)
+        track.confidence = 1.0
+        if w <= 0 or h <= 0:
+            track.points = None
+            return
+
+        pts = cv2.goodFeaturesToTrack(
+            gray[y:y+h, x:x+w], MAX_POINTS_PER_TRACK, 0.01, 5
+        )
+        if pts is None:
+            track.points = None
+            return
+        track.points = (pts.reshape(-1, 2) + (x, y)).astype(np.float32)
+
+    # ------------------------------------------
+    #   SEGUIMIENTO CON FLUJO ÓPTICO
+    # ------------------------------------------
+    def _follow(self, gray):
+        """Mueve todos los tracks; devuelve False si alguno perdió confianza."""
+        tracks = [t for t in self.tracks if t.points is not None and len(t.points) >= MIN_POINTS_PER_TRACK]
+        if len(tracks) != len(self.tracks):
+            return False
+
+        # Un solo cálculo de flujo para todos los puntos del frame
+        sizes = [len(t.points) for t in tracks]
+        p0 = np.concatenate([t.points for t in tracks]).reshape(-1, 1, 2)
+
+        p1, st1, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, p0, None, **LK_PARAMS)
+        p0r, st2, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, p1, None, **LK_PARAMS)
+
+        fb_error = np.linalg.norm(p0 - p0r, axis=2).ravel()
+        valid = (st1.ravel() == 1) & (st2.ravel() == 1) & (fb_error < FB_ERROR_MAX)
+        p0 = p0.reshape(-1, 2)
+        p1 = p1.reshape(-1, 2)
+
+        ok = True
+        start = 0
+        for track, n in zip(tracks, sizes):
+            sl = slice(start, start + n)
+            start += n
+
+            good = valid[sl]
+            track.confidence = float(good.mean())
+            if good.sum() < MIN_POINTS_PER_TRACK or track.confidence < self.min_confidence:
+                ok = False
+                continue
+
+            old, new = p0[sl][good], p1[sl][good]
+            dx, dy = np.median(new - old, axis=0)
+
+            # Escala: razón mediana de distancias al centroide
+            d_old = np.linalg.norm(old - old.mean(axis=0), axis=1)
+            d_new = np.linalg.norm(new - new.mean(axis=0), axis=1)
+            mask = d_old > 1e-3
+            scale = float(np.median(d_new[mask] / d_old[mask])) if mask.any() else 1.0
+
+            x, y, w, h = track._box
+            cx, cy = x + w / 2 + dx, y + h / 2 + dy
+            w, h = w * scale, h * scale
+            track.box = (cx - w / 2, cy - h / 2, w, h)
+            track.points = new
+
+        return ok
+
+
+def clip_box(box, shape):
+    """Recorta una caja (x, y, w, h) a los límites de la imagen."""
+    img_h, img_w = shape[:2]
+    x, y, w, h = box
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(img_w, x + w), min(img_h, y + h)
+    return x1, y1, max(0, x2 - x1), max(0, y2 - y1)
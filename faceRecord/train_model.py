@@ -2,12 +2,64 @@ import cv2
 import os
 import numpy as np
 import json
+import hashlib
+import time
+import functools
+import threading
+
+from recognizers import SFACE_GALLERY, LBPH_BINARY, LABEL_FILES, load_sface, embed_faces
+from lbph_engine import LBPHEngine
+from jobs import process_pool
+from packed_dataset import is_packed, load_packed, load_index, read_faces
 
 FACE_SIZE = 200
 DEFAULT_BASE_DIR = "dataset"   # <-- valor por defecto
 MAPPING_FILE = "mapping.json"
-LABELS_OUT = "labels.txt"
 MODEL_OUT = "face_model.xml"
+BINARY_OUT = LBPH_BINARY
+GALLERY_OUT = SFACE_GALLERY
+# "lbph" -> XML de OpenCV, "lbph_np" -> binario con memory-map, "sface" -> galería
+MODEL_OUTPUTS = {"lbph": MODEL_OUT, "lbph_np": BINARY_OUT, "sface": GALLERY_OUT}
+# Cada backend: (labels.txt, label_index carpeta -> label numérico)
+LABEL_OUTPUTS = LABEL_FILES
+
+# Caché de carpetas preprocesadas (resize + equalize + augment)
+CACHE_DIR = "train_cache"
+CACHE_VERSION = 1                  # subir si cambian augment_image o normalize_image
+LOAD_WORKERS = os.cpu_count() or 1
+
+# Condensación: prototipos máximos por residente (None = todas las muestras).
+# LBPH guarda y recorre un histograma por muestra en cada predict.
+MAX_SAMPLES_PER_RESIDENT = 300
+CONDENSE_SIZE = 24                 # lado de la miniatura usada para agrupar
+
+# Un entrenamiento a la vez por proceso: train_model y train_resident leen,
+# modifican y republican el modelo, label_index y mapping.json. Reentrante
+# porque train_resident cae a train_model cuando no hay modelo previo.
+TRAIN_LOCK = threading.RLock()
+
+
+def exclusive(fn):
+    """Serializa fn con TRAIN_LOCK (API, callbacks de la GUI o CLI)."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with TRAIN_LOCK:
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def tmp_path(path):
+    """Ruta temporal con la misma extensión (cv2 elige el formato por ella)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.tmp{ext}"
+
+
+def publish(tmp, path):
+    """
+    Reemplazo atómico: el microservicio vigila estos archivos y nunca debe
+    leer uno a medio escribir.
+    """
+    os.replace(tmp, path)
 
 
 def augment_image(image):
@@ -49,58 +101,270 @@ def load_mapping():
 
 
 def save_mapping(mapping):
-    with open(MAPPING_FILE, "w", encoding="utf-8") as f:
+    tmp = tmp_path(MAPPING_FILE)
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(mapping, f, indent=2, ensure_ascii=False)
+    publish(tmp, MAPPING_FILE)
+
+
+def load_label_index(backend):
+    path = LABEL_OUTPUTS[backend][1]
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
 
+def save_label_index(index, backend):
+    path = LABEL_OUTPUTS[backend][1]
+    tmp = tmp_path(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    publish(tmp, path)
 
-def load_images(base_dir):
+
+def preprocess_folder(folder_path, augment=True):
+    """Imágenes (y augmentaciones) de UN residente como arreglo N×FACE_SIZE×FACE_SIZE."""
+    # JPEG sueltos o faces.npy empaquetado
+    return preprocess_faces(read_faces(folder_path), augment)
+
+
+def preprocess_faces(images, augment=True):
     faces = []
-    labels = []
+
+    for image in images:
+        # resize + normalize
+        image = cv2.resize(image, (FACE_SIZE, FACE_SIZE))
+        image = normalize_image(image)
+
+        faces.append(image)
+
+        if not augment:
+            continue
+
+        # augment
+        for aug in augment_image(image):
+            aug = cv2.resize(aug, (FACE_SIZE, FACE_SIZE))
+            aug = normalize_image(aug)
+            faces.append(aug)
+
+    if not faces:
+        return np.empty((0, FACE_SIZE, FACE_SIZE), dtype=np.uint8)
+    return np.stack(faces)
+
+
+def condense(faces, max_samples):
+    """
+    Índices de hasta `max_samples` prototipos representativos: agrupa las
+    muestras con k-means sobre miniaturas y conserva el medoide de cada grupo
+    (una muestra real, no un promedio, para que LBPH la pueda usar).
+    """
+    n = len(faces)
+    if not max_samples or n <= max_samples:
+        return np.arange(n)
+
+    size = (CONDENSE_SIZE, CONDENSE_SIZE)
+    feats = np.stack([
+        cv2.resize(face, size, interpolation=cv2.INTER_AREA) for face in faces
+    ]).reshape(n, -1).astype(np.float32)
+    feats -= feats.mean(axis=1, keepdims=True)
+    feats /= np.linalg.norm(feats, axis=1, keepdims=True) + 1e-6
+
+    cv2.setRNGSeed(0)   # mismos prototipos en cada entrenamiento
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1e-3)
+    _, assign, centers = cv2.kmeans(feats, max_samples, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+    assign = assign.ravel()
+
+    # Medoide: la muestra más cercana al centro de su grupo
+    dist = ((feats - centers[assign]) ** 2).sum(axis=1)
+    order = np.lexsort((dist, assign))
+    first = np.r_[True, assign[order][1:] != assign[order][:-1]]
+    return np.sort(order[first])
+
+
+# ------------------------------------------
+#   CACHÉ POR CARPETA
+# ------------------------------------------
+def folder_key(folder_path, augment, max_samples=None):
+    """Huella de la carpeta: archivos (ruta, mtime, tamaño) + ajustes de preproceso."""
+    h = hashlib.sha1(f"{CACHE_VERSION}:{FACE_SIZE}:{augment}:{max_samples}:{CONDENSE_SIZE}".encode())
+    for entry in sorted(os.scandir(folder_path), key=lambda e: e.name):
+        if entry.is_file():
+            st = entry.stat()
+            h.update(f"{entry.path}:{st.st_mtime_ns}:{st.st_size}".encode())
+    return h.hexdigest()
+
+
+def cache_path(folder_path, augment, max_samples=None):
+    name = os.path.basename(os.path.normpath(folder_path))
+    suffix = ("_aug" if augment else "") + (f"_max{max_samples}" if max_samples else "")
+    return os.path.join(CACHE_DIR, f"{name}{suffix}.npz")
+
+
+def read_cache(folder_path, augment, max_samples=None):
+    """Devuelve las caras cacheadas o None si la caché no existe o está vieja."""
+    # Sin augmentación, una carpeta empaquetada ya es su propia caché (memory-map):
+    # write_packed guarda las caras redimensionadas y ecualizadas. Los paquetes
+    # anteriores (sin "equalized") guardaban las variantes de brillo tal cual y
+    # pasan por el preproceso normal.
+    if not augment and is_packed(folder_path) and load_index(folder_path).get("equalized"):
+        faces = load_packed(folder_path)
+        if not max_samples or len(faces) <= max_samples:
+            return faces
+
+    path = cache_path(folder_path, augment, max_samples)
+    if not os.path.exists(path):
+        return None
+    key = folder_key(folder_path, augment, max_samples)
+    try:
+        with np.load(path) as data:
+            if str(data["key"]) != key:
+                return None
+            return data["faces"]
+    except Exception:
+        return None
+
+
+def build_cache(folder_path, augment, max_samples=None):
+    """Preprocesa (y condensa) la carpeta y guarda la caché (en el pool o en este proceso)."""
+    key = folder_key(folder_path, augment, max_samples)
+    faces = preprocess_folder(folder_path, augment)
+    faces = faces[condense(faces, max_samples)]
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(folder_path, augment, max_samples)
+    tmp = tmp_path(path)
+    with open(tmp, "wb") as f:
+        np.savez(f, key=key, faces=faces)
+    publish(tmp, path)
+    return faces
+
+
+def load_folder(folder_path, model_label, augment=True, max_samples=None):
+    """Caras de UN residente (desde caché si no cambió), todas con el mismo label."""
+    faces = read_cache(folder_path, augment, max_samples)
+    if faces is None:
+        faces = build_cache(folder_path, augment, max_samples)
+    return list(faces), [model_label] * len(faces)
+
+
+def _build_cache_job(args):
+    # En el pool solo se devuelve la ruta: el padre lee la caché del disco
+    build_cache(*args)
+    return cache_path(*args)
+
+
+def load_images(base_dir, augment=True, workers=LOAD_WORKERS, max_samples=None):
+    """
+    Carga todo el dataset. Las carpetas sin cambios salen de la caché; el
+    resto se preprocesa en paralelo (un proceso por núcleo) y cada proceso
+    escribe su propia caché, así solo viajan rutas entre procesos.
+
+    max_samples limita las muestras de cada residente (ver condense).
+    """
+    start = time.perf_counter()
 
     # lee carpetas del dataset
     folder_list = sorted([
         d for d in os.listdir(base_dir)
         if os.path.isdir(os.path.join(base_dir, d))
     ])
+    folder_paths = [os.path.join(base_dir, d) for d in folder_list]
+
+    folder_faces = {p: read_cache(p, augment, max_samples) for p in folder_paths}
+    stale = [p for p in folder_paths if folder_faces[p] is None]
+
+    if len(stale) > 1 and workers > 1:
+        with process_pool(min(workers, len(stale))) as pool:
+            list(pool.map(_build_cache_job, [(p, augment, max_samples) for p in stale]))
+        for p in stale:
+            # Si la carpeta cambió mientras tanto, se reprocesa aquí
+            folder_faces[p] = read_cache(p, augment, max_samples)
+            if folder_faces[p] is None:
+                folder_faces[p] = build_cache(p, augment, max_samples)
+    else:
+        for p in stale:
+            folder_faces[p] = build_cache(p, augment, max_samples)
 
-    for model_label, folder_name in enumerate(folder_list):
-        folder_path = os.path.join(base_dir, folder_name)
-
-        for image_name in os.listdir(folder_path):
-            image_path = os.path.join(folder_path, image_name)
-            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-            if image is None:
-                continue
-
-            # resize + normalize
-            image = cv2.resize(image, (FACE_SIZE, FACE_SIZE))
-            image = normalize_image(image)
-
-            faces.append(image)
-            labels.append(model_label)
+    faces = []
+    labels = []
+    for model_label, p in enumerate(folder_paths):
+        faces += list(folder_faces[p])
+        labels += [model_label] * len(folder_faces[p])
 
-            # augment
-            for aug in augment_image(image):
-                aug = cv2.resize(aug, (FACE_SIZE, FACE_SIZE))
-                aug = normalize_image(aug)
-                faces.append(aug)
-                labels.append(model_label)
+    print(f"[TRAIN] {len(folder_list)} carpetas cargadas ({len(folder_list) - len(stale)} desde caché, "
+          f"{len(stale)} preprocesadas) en {time.perf_counter() - start:.1f} s")
 
     return faces, labels, folder_list
 
 
-def train_model(dataset_path=DEFAULT_BASE_DIR):
+def label_names(label_index, mapping):
+    """{label: ID real} (o DESCONOCIDO_<carpeta> si no está en mapping.json)."""
+    names = {}
+    for folder_name, model_label in sorted(label_index.items(), key=lambda item: item[1]):
+        if folder_name in mapping:
+            names[model_label] = str(mapping[folder_name])
+        else:
+            print(f"⚠️ '{folder_name}' no tiene ID en mapping.json")
+            names[model_label] = f"DESCONOCIDO_{folder_name}"
+    return names
+
+
+def write_labels(names, backend):
+    """Escribe el labels.txt del backend ordenado por label."""
+    path = LABEL_OUTPUTS[backend][0]
+    tmp = tmp_path(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        for model_label, name in sorted(names.items()):
+            f.write(f"{model_label}:{name}\n")
+    publish(tmp, path)
+
+
+def build_binary(faces, labels, names):
+    """Entrena el motor NumPy y guarda el modelo binario (face_model.lbph)."""
+    engine = LBPHEngine()
+    engine.train(faces, labels)
+    engine.label_names = names
+    return engine.save(BINARY_OUT)
+
+
+def build_gallery(faces, labels):
+    """Calcula los embeddings SFace de cada muestra y guarda la galería."""
+    net = load_sface()
+    embeddings = embed_faces(net, faces)
+    tmp = tmp_path(GALLERY_OUT)
+    with open(tmp, "wb") as f:
+        np.savez(f, embeddings=embeddings, labels=np.asarray(labels, dtype=np.int32))
+    publish(tmp, GALLERY_OUT)
+    return GALLERY_OUT
+
+
+@exclusive
+def train_model(dataset_path=DEFAULT_BASE_DIR, backend="lbph", max_samples=MAX_SAMPLES_PER_RESIDENT,
+                workers=LOAD_WORKERS):
     """
-    Entrena el modelo LBPH usando el dataset ubicado en `dataset_path`.
+    Entrena el modelo usando el dataset ubicado en `dataset_path`.
     Compatible con microservicio FastAPI.
+
+    backend="lbph" entrena LBPH (face_model.xml), backend="lbph_np" el mismo
+    LBPH en formato binario (face_model.lbph) y backend="sface" construye la
+    galería de embeddings (face_gallery.npz) sin augmentación.
+    max_samples limita los prototipos por residente (None = sin límite).
+    workers: procesos para preprocesar carpetas (en el microservicio, la
+    parte del presupuesto de CPU que le toca al trabajo; ver jobs.worker_budget).
     """
-    print(f"[TRAIN] Usando dataset en: {dataset_path}")
+    print(f"[TRAIN] Usando dataset en: {dataset_path} (backend: {backend})")
 
     if not os.path.exists(dataset_path):
         raise RuntimeError(f"No existe la carpeta dataset en: {dataset_path}")
 
+    if backend not in MODEL_OUTPUTS:
+        raise RuntimeError(f"Backend de reconocimiento desconocido: {backend}")
+
     mapping = load_mapping()
-    faces, labels, folder_list = load_images(dataset_path)
+    faces, labels, folder_list = load_images(
+        dataset_path, augment=(backend != "sface"), workers=workers, max_samples=max_samples
+    )
 
     if len(faces) == 0:
         raise RuntimeError(
@@ -111,27 +375,171 @@ def train_model(dataset_path=DEFAULT_BASE_DIR):
     # convertir a numpy
     labels_np = np.array(labels)
 
-    # crear, entrenar y guardar modelo LBPH
-    face_recognizer = cv2.face.LBPHFaceRecognizer_create()
-    face_recognizer.train(faces, labels_np)
-    face_recognizer.write(MODEL_OUT)
-
-    # escribir labels
-    with open(LABELS_OUT, "w", encoding="utf-8") as f:
-        for model_label, folder_name in enumerate(folder_list):
-            if folder_name in mapping:
-                id_real = mapping[folder_name]
-                f.write(f"{model_label}:{id_real}\n")
-            else:
-                print(f"⚠️ '{folder_name}' no tiene ID en mapping.json")
-                f.write(f"{model_label}:DESCONOCIDO_{folder_name}\n")
+    # labels (y la carpeta de cada label, para entrenar incremental)
+    label_index = {folder_name: label for label, folder_name in enumerate(folder_list)}
+    names = label_names(label_index, mapping)
+
+    if backend == "sface":
+        model_out = build_gallery(faces, labels_np)
+    elif backend == "lbph_np":
+        model_out = build_binary(faces, labels_np, names)
+    else:
+        # crear, entrenar y guardar modelo LBPH
+        face_recognizer = cv2.face.LBPHFaceRecognizer_create()
+        face_recognizer.train(faces, labels_np)
+        face_recognizer.write(tmp_path(MODEL_OUT))
+        publish(tmp_path(MODEL_OUT), MODEL_OUT)
+        model_out = MODEL_OUT
+
+    save_label_index(label_index, backend)
+    write_labels(names, backend)
 
     print("✅ Modelo entrenado correctamente.")
-    print(f"   Modelo   → {MODEL_OUT}")
-    print(f"   Labels   → {LABELS_OUT}")
+    print(f"   Modelo   → {model_out}")
+    print(f"   Labels   → {LABEL_OUTPUTS[backend][0]}")
     print(f"   Mapping  → {MAPPING_FILE}")
 
-    return MODEL_OUT   # <-- DEVUELVE LA RUTA PARA FASTAPI
+    return model_out   # <-- DEVUELVE LA RUTA PARA FASTAPI
+
+
+# ============================================
+#   ENTRENAMIENTO INCREMENTAL (un residente)
+# ============================================
+def write_lbph(model, histograms, labels, path):
+    """Escribe un modelo LBPH con los histogramas dados (mismo formato que cv2)."""
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+    fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+    fs.write("threshold", model.getThreshold())
+    fs.write("radius", model.getRadius())
+    fs.write("neighbors", model.getNeighbors())
+    fs.write("grid_x", model.getGridX())
+    fs.write("grid_y", model.getGridY())
+    fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+    for hist in histograms:
+        fs.write("", hist)
+    fs.endWriteStruct()
+    fs.write("labels", np.asarray(labels, dtype=np.int32).reshape(-1, 1))
+    fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+    fs.endWriteStruct()
+    fs.endWriteStruct()
+    fs.release()
+
+
+def update_lbph(faces, labels, model_label, replace):
+    """
+    Añade las muestras al modelo existente con update(). Si el residente ya
+    estaba, sus histogramas viejos se descartan y se escriben los nuevos; el
+    resto del modelo no se recalcula.
+    """
+    model = cv2.face.LBPHFaceRecognizer_create()
+    model.read(MODEL_OUT)
+    tmp = tmp_path(MODEL_OUT)
+
+    if not replace:
+        model.update(faces, np.array(labels))
+        model.write(tmp)
+    else:
+        old_labels = model.getLabels().ravel()
+        keep = [h for h, l in zip(model.getHistograms(), old_labels) if l != model_label]
+
+        # Histogramas nuevos con los mismos parámetros LBPH
+        fresh = cv2.face.LBPHFaceRecognizer_create(
+            model.getRadius(), model.getNeighbors(), model.getGridX(), model.getGridY()
+        )
+        fresh.train(faces, np.array(labels))
+
+        write_lbph(
+            model,
+            keep + list(fresh.getHistograms()),
+            np.concatenate([old_labels[old_labels != model_label], np.array(labels)]),
+            tmp,
+        )
+
+    publish(tmp, MODEL_OUT)
+    return MODEL_OUT
+
+
+def update_binary(faces, labels, model_label, names):
+    """Quita las muestras viejas del residente, añade las nuevas y reescribe el binario."""
+    engine = LBPHEngine.load(BINARY_OUT, mmap=False)
+    engine.remove_label(model_label)
+    engine.update(faces, labels)
+    engine.label_names = names
+    return engine.save(BINARY_OUT)
+
+
+def update_gallery(faces, labels, model_label):
+    """Reemplaza (o añade) solo las filas de la galería SFace de este residente."""
+    data = np.load(GALLERY_OUT)
+    keep = data["labels"] != model_label
+
+    embeddings = np.concatenate([data["embeddings"][keep], embed_faces(load_sface(), faces)])
+    all_labels = np.concatenate([data["labels"][keep], np.asarray(labels, dtype=np.int32)])
+
+    tmp = tmp_path(GALLERY_OUT)
+    with open(tmp, "wb") as f:
+        np.savez(f, embeddings=embeddings, labels=all_labels)
+    publish(tmp, GALLERY_OUT)
+    return GALLERY_OUT
+
+
+@exclusive
+def train_resident(folder_name, dataset_path=DEFAULT_BASE_DIR, backend="lbph", resident_id=None,
+                   max_samples=MAX_SAMPLES_PER_RESIDENT, workers=LOAD_WORKERS):
+    """
+    Entrena SOLO la carpeta `folder_name` sobre el modelo existente.
+
+    Un residente nuevo recibe el siguiente label libre; uno existente
+    reemplaza sus muestras. Si todavía no hay modelo (o label_index del
+    backend) se hace el entrenamiento completo.
+    """
+    print(f"[TRAIN] Entrenamiento incremental de '{folder_name}' (backend: {backend})")
+
+    folder_path = os.path.join(dataset_path, folder_name)
+    if not os.path.isdir(folder_path):
+        raise RuntimeError(f"No existe la carpeta del residente: {folder_path}")
+
+    if backend not in MODEL_OUTPUTS:
+        raise RuntimeError(f"Backend de reconocimiento desconocido: {backend}")
+
+    # ✅ Mantener mapping.json al día: carpeta -> ID real
+    mapping = load_mapping()
+    if resident_id is not None and mapping.get(folder_name) != resident_id:
+        mapping[folder_name] = resident_id
+        save_mapping(mapping)
+
+    model_out = MODEL_OUTPUTS[backend]
+    label_index = load_label_index(backend)
+    if not label_index or not os.path.exists(model_out):
+        print("[TRAIN] No hay modelo previo, se entrena el dataset completo")
+        return train_model(dataset_path, backend=backend, max_samples=max_samples, workers=workers)
+
+    replace = folder_name in label_index
+    model_label = label_index[folder_name] if replace else max(label_index.values()) + 1
+
+    faces, labels = load_folder(
+        folder_path, model_label, augment=(backend != "sface"), max_samples=max_samples
+    )
+    if len(faces) == 0:
+        raise RuntimeError(f"No hay imágenes en {folder_path}")
+
+    label_index[folder_name] = model_label
+    names = label_names(label_index, mapping)
+
+    if backend == "sface":
+        update_gallery(faces, labels, model_label)
+    elif backend == "lbph_np":
+        update_binary(faces, labels, model_label, names)
+    else:
+        update_lbph(faces, labels, model_label, replace)
+
+    save_label_index(label_index, backend)
+    write_labels(names, backend)
+
+    print(f"✅ Residente {'actualizado' if replace else 'añadido'}: {folder_name} → label {model_label} "
+          f"({len(faces)} muestras)")
+
+    return model_out
 
 
 # --------------------------------------------------------------------
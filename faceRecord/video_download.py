@@ -0,0 +1,137 @@
+# microservicio/video_download.py
+"""
+Obtención del video de enrolamiento.
+
+1. Se intenta decodificar directamente desde la URL (FFmpeg dentro de
+   OpenCV lee por HTTP a medida que decodifica y usa peticiones Range al
+   hacer seek). La descarga y la extracción quedan solapadas y los
+   segmentos paralelos solo bajan los tramos que analizan.
+2. Si el backend de OpenCV no puede abrir la URL, se descarga a un archivo
+   temporal preasignado con varias peticiones Range en paralelo (o con una
+   sola petición si el servidor no acepta rangos).
+
+Solo se aceptan URLs http(s). Un archivo local solo se acepta si está dentro
+de LOCAL_VIDEO_DIR (variable de entorno; sin ella no se aceptan rutas): la
+ruta llega por la API y no debe poder leer cualquier archivo del servidor.
+"""
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import requests
+
+TEMP_DIR = "./temp_videos"
+DOWNLOAD_PARTS = 4              # peticiones Range simultáneas
+DOWNLOAD_CHUNK = 1024 * 1024    # 1 MB por escritura (antes 8 KB)
+DOWNLOAD_TIMEOUT = 30
+LOCAL_VIDEO_DIR = os.environ.get("LOCAL_VIDEO_DIR")   # None = solo URLs
+
+
+def is_remote(source):
+    return source.startswith(("http://", "https://"))
+
+
+def local_video(path):
+    """Ruta real de un video local permitido; ValueError si no lo está."""
+    if not LOCAL_VIDEO_DIR:
+        raise ValueError("Solo se aceptan videos por URL http(s)")
+    root = os.path.realpath(LOCAL_VIDEO_DIR)
+    real = os.path.realpath(path)
+    if os.path.commonpath([root, real]) != root or not os.path.isfile(real):
+        raise ValueError(f"Video fuera de LOCAL_VIDEO_DIR: {path}")
+    return real
+
+
+def check_video_source(url):
+    """ValueError si la fuente no es una URL http(s) ni un video permitido."""
+    if not is_remote(url):
+        local_video(url)
+
+
+def open_stream(url):
+    """
+    Abre la URL con FFmpeg (ya lee encabezados y prueba el códec). Devuelve
+    la captura abierta, que se reutiliza para extraer, o None.
+    """
+    cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+    if cap.isOpened():
+        return cap
+    cap.release()
+    return None
+
+
+def _download_range(url, path, start, end):
+    headers = {"Range": f"bytes={start}-{end}"}
+    with requests.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code != 206:
+            raise RuntimeError(f"El servidor no respetó el rango {start}-{end} ({response.status_code})")
+        with open(path, "r+b") as f:
+            f.seek(start)
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                f.write(chunk)
+
+
+def _download_single(url, path):
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"No se pudo descargar el video ({response.status_code})")
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                f.write(chunk)
+
+
+def download_video(url, path, parts=DOWNLOAD_PARTS):
+    """Descarga `url` en `path`, en paralelo por rangos si el servidor lo permite."""
+    head = requests.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+    size = int(head.headers.get("Content-Length") or 0)
+    ranges_ok = head.headers.get("Accept-Ranges", "").lower() == "bytes"
+
+    if head.status_code != 200 or not ranges_ok or size < parts * DOWNLOAD_CHUNK:
+        _download_single(url, path)
+        return path
+
+    # Archivo preasignado: cada hilo escribe su tramo en su offset
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+    bounds = [size * i // parts for i in range(parts + 1)]
+    with ThreadPoolExecutor(max_workers=parts) as pool:
+        futures = [
+            pool.submit(_download_range, head.url, path, bounds[i], bounds[i + 1] - 1)
+            for i in range(parts)
+        ]
+        for future in futures:
+            future.result()
+    return path
+
+
+def open_video_source(url, log=print):
+    """
+    Devuelve (fuente, ruta_temporal, captura). `fuente` es lo que se le pasa
+    a extract_faces; `captura` (o None) es la VideoCapture ya abierta sobre la
+    URL, para no abrirla dos veces; `ruta_temporal` (o None) debe borrarse al
+    terminar, también si la extracción falla.
+    """
+    if not is_remote(url):
+        return local_video(url), None, None
+
+    cap = open_stream(url)
+    if cap is not None:
+        log("Decodificando el video directamente desde la URL (sin descarga previa)")
+        return url, None, cap
+
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    temp_path = os.path.join(TEMP_DIR, f"temp_{uuid.uuid4()}.mp4")
+    log("Descargando video desde Supabase...")
+    try:
+        download_video(url, temp_path)
+    except Exception:
+        remove_temp(temp_path)
+        raise
+    return temp_path, temp_path, None
+
+
+def remove_temp(path):
+    if path and os.path.exists(path):
+        os.remove(path)
@@ -1,9 +1,9 @@
 import React, { useEffect, useState } from "react";
 import { saveAs } from "file-saver";
+import { fetchAllResidentes } from "../residentes/services/residents.service";
 
 export default function Dashboard() {
     const [residentes, setResidentes] = useState([]);
-    const [accesos, setAccesos] = useState([]);
     const [loading, setLoading] = useState(true);
 
     // Pagination
@@ -15,17 +15,14 @@ export default function Dashboard() {
         page * itemsPerPage
     );
 
+    // Solo las columnas que muestra el dashboard (KPIs, tabla y exportación)
+    const fields = "nombre,dni,departamento,estado,necesita_entrenamiento,video_url";
+
     useEffect(() => {
-        Promise.all([
-            fetch("http://localhost:5000/residentes/").then((res) =>
-                res.json()
-            ),
-            fetch("http://localhost:5000/accesos/").then((res) => res.json()),
-        ])
-            .then(([res1, res2]) => {
-                setResidentes(res1.data || []);
-                setAccesos(res2.data || []);
-            })
+        // KPIs y exportación cubren a todos los residentes, no solo la primera página
+        fetchAllResidentes({ fields })
+            .then(setResidentes)
+            .catch((err) => console.error("Error cargando residentes", err))
             .finally(() => setLoading(false));
     }, []);
 
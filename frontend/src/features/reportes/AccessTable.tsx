@@ -11,75 +11,95 @@ type Acceso = {
     nombre_residente?: string;
 };
 
+const API_URL = "http://localhost:5000/accesos/";
+const EXPORT_FETCH_SIZE = 1000; // máximo que acepta el backend por página
+
 export default function AccessTable() {
     const [data, setData] = useState<Acceso[]>([]);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState<string | null>(null);
+    const [exporting, setExporting] = useState(false);
 
-    // filtros
+    // filtros (todos se aplican en el servidor)
     const [search, setSearch] = useState("");
+    const [debouncedSearch, setDebouncedSearch] = useState("");
     const [tipoFilter, setTipoFilter] = useState("all");
     const [knownFilter, setKnownFilter] = useState("all");
 
-    // paginación
+    // paginación (el servidor entrega bloques de fetchSize con next_cursor)
     const [page, setPage] = useState(1);
     const pageSize = 10;
+    const fetchSize = 100;
+    const [nextCursor, setNextCursor] = useState<number | null>(null);
+
+    const buildParams = (cursor: number | null, limit: number) => {
+        const params = new URLSearchParams({ limit: String(limit) });
+        if (cursor !== null) params.set("cursor", String(cursor));
+        if (tipoFilter !== "all") params.set("tipo", tipoFilter);
+        if (knownFilter !== "all") params.set("conocido", String(knownFilter === "yes"));
+        if (debouncedSearch.trim()) params.set("q", debouncedSearch.trim());
+        return params;
+    };
 
-    useEffect(() => {
-        const fetchData = async () => {
-            setLoading(true);
-            try {
-                const res = await fetch("http://localhost:5000/accesos/");
-                const json = await res.json();
-                setData(json.data || []);
-            } catch (err: any) {
-                setError(err.message);
-            } finally {
-                setLoading(false);
-            }
-        };
-
-        fetchData();
-    }, []);
-
-    // Filtrado
-    const filtered = useMemo(() => {
-        let rows = [...data];
-
-        if (search.trim()) {
-            const q = search.toLowerCase();
-            rows = rows.filter(
-                (r) =>
-                    (r.nombre_residente ?? "").toLowerCase().includes(q) ||
-                    (r.tipo ?? "").toLowerCase().includes(q) ||
-                    (r.fecha ?? "").toLowerCase().includes(q)
-            );
-        }
+    const fetchPage = async (cursor: number | null, limit: number) => {
+        const res = await fetch(`${API_URL}?${buildParams(cursor, limit)}`);
+        const json = await res.json();
+        if (json.status === "error") throw new Error(json.msg);
+        return { rows: (json.data || []) as Acceso[], next: (json.next_cursor ?? null) as number | null };
+    };
 
-        if (tipoFilter !== "all") {
-            rows = rows.filter((r) => r.tipo === tipoFilter);
+    const fetchData = async (cursor: number | null) => {
+        setLoading(true);
+        setError(null);
+        try {
+            const { rows, next } = await fetchPage(cursor, fetchSize);
+            setData((prev) => (cursor === null ? [] : prev).concat(rows));
+            setNextCursor(next);
+        } catch (err: any) {
+            setError(err.message);
+        } finally {
+            setLoading(false);
         }
+    };
 
-        if (knownFilter !== "all") {
-            const isKnown = knownFilter === "yes";
-            rows = rows.filter(
-                (r) => Boolean(r.residente_id) === isKnown
-            );
-        }
+    // La búsqueda se manda al servidor cuando se deja de escribir
+    useEffect(() => {
+        const timer = setTimeout(() => setDebouncedSearch(search), 300);
+        return () => clearTimeout(timer);
+    }, [search]);
 
-        return rows;
-    }, [data, search, tipoFilter, knownFilter]);
+    // Al cambiar un filtro se vuelve a la primera página
+    useEffect(() => {
+        fetchData(null);
+    }, [tipoFilter, knownFilter, debouncedSearch]);
 
-    const totalPages = Math.ceil(filtered.length / pageSize);
+    const totalPages = Math.max(1, Math.ceil(data.length / pageSize));
+    const hasMore = nextCursor !== null;
 
     const pageRows = useMemo(() => {
         const start = (page - 1) * pageSize;
-        return filtered.slice(start, start + pageSize);
-    }, [filtered, page]);
+        return data.slice(start, start + pageSize);
+    }, [data, page]);
+
+    // Exportar Excel: todas las filas que cumplen los filtros, no solo las cargadas
+    const exportExcel = async () => {
+        setExporting(true);
+        let rows: Acceso[] = [];
+        try {
+            let cursor: number | null = null;
+            do {
+                const { rows: chunk, next } = await fetchPage(cursor, EXPORT_FETCH_SIZE);
+                rows = rows.concat(chunk);
+                cursor = next;
+            } while (cursor !== null);
+        } catch (err: any) {
+            setError(err.message);
+            return;
+        } finally {
+            setExporting(false);
+        }
 
-    // Exportar Excel
-    const exportExcel = () => {
-        const wsData = filtered.map((r) => ({
+        const wsData = rows.map((r) => ({
             ID: r.id,
             Tipo: r.tipo,
             Fecha: r.fecha,
@@ -138,9 +158,10 @@ export default function AccessTable() {
 
                 <button
                     onClick={exportExcel}
-                    className="px-4 py-2 bg-slate-900 text-white rounded-md"
+                    disabled={exporting}
+                    className="px-4 py-2 bg-slate-900 text-white rounded-md disabled:opacity-50"
                 >
-                    Exportar Excel
+                    {exporting ? "Exportando..." : "Exportar Excel"}
                 </button>
             </div>
 
@@ -198,6 +219,7 @@ export default function AccessTable() {
             <div className="flex justify-between items-center mt-4">
                 <div>
                     Página {page} de {totalPages}
+                    {hasMore ? "+" : ""}
                 </div>
                 <div className="flex gap-2">
                     <button
@@ -208,10 +230,14 @@ export default function AccessTable() {
                         Anterior
                     </button>
                     <button
-                        onClick={() =>
-                            setPage((p) => Math.min(totalPages, p + 1))
-                        }
-                        disabled={page === totalPages}
+                        onClick={async () => {
+                            // Al llegar al final de lo cargado se pide el siguiente bloque
+                            if (page === totalPages && hasMore) {
+                                await fetchData(nextCursor);
+                            }
+                            setPage((p) => p + 1);
+                        }}
+                        disabled={loading || (page === totalPages && !hasMore)}
                         className="px-3 py-1 border rounded disabled:opacity-50"
                     >
                         Siguiente
@@ -1,12 +1,12 @@
 import { useEffect, useState } from "react";
+import { fetchAllResidentes } from "../services/residents.service";
 
 export default function ResidentStatsCards() {
     const [residentes, setResidentes] = useState([]);
 
     useEffect(() => {
-        fetch("http://localhost:5000/residentes")
-            .then(res => res.json())
-            .then(res => setResidentes(res.data))
+        fetchAllResidentes({ fields: "estado,video_url,necesita_entrenamiento" })
+            .then(setResidentes)
             .catch(err => console.error("Error cargando residentes", err));
     }, []);
 
@@ -1,6 +1,7 @@
 import { useEffect, useState } from "react";
 import Avatar from "./Avatar";
 import EditModal from "./EditModal";
+import { fetchAllResidentes } from "../services/residents.service";
 
 export default function ResidentsTable() {
     const [residentes, setResidentes] = useState([]);
@@ -11,12 +12,9 @@ export default function ResidentsTable() {
     const perPage = 10;
 
     const loadResidentes = () => {
-        fetch("http://localhost:5000/residentes")
-            .then((res) => res.json())
-            .then((res) => {
-                const activos = res.data.filter((r) => r.estado === "activo");
-                setResidentes(activos);
-            })
+        // La tabla ordena en el cliente: necesita todas las páginas
+        fetchAllResidentes({ estado: "activo" })
+            .then(setResidentes)
             .catch((err) => console.error("Error cargando residentes", err));
     };
 
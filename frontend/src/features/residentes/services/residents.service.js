@@ -13,3 +13,23 @@ export async function uploadVideoResident(formData) {
         body: formData,
     });
 }
+
+// El backend pagina /residentes (next_cursor): se siguen las páginas hasta el final
+const PAGE_SIZE = 1000;
+
+export async function fetchAllResidentes(params = {}) {
+    let rows = [];
+    let cursor = null;
+    do {
+        const query = new URLSearchParams({ ...params, limit: String(PAGE_SIZE) });
+        if (cursor !== null) query.set("cursor", String(cursor));
+
+        const res = await fetch(`${API_URL}/?${query}`);
+        const json = await res.json();
+        if (json.status === "error") throw new Error(json.msg);
+
+        rows = rows.concat(json.data || []);
+        cursor = json.next_cursor ?? null;
+    } while (cursor !== null);
+    return rows;
+}
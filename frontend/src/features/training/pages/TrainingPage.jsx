@@ -29,7 +29,23 @@ export default function TrainingPage() {
                 body: JSON.stringify({}), // No mandar rutas relativas
             });
 
-            const data = await response.json();
+            let data = await response.json();
+
+            // El microservicio encola el entrenamiento: esperar al trabajo
+            while (data.job_id && data.status !== "error") {
+                const job = data.job;
+                if (job.state === "success") {
+                    data = { status: "success" };
+                    break;
+                }
+                if (job.state === "error") {
+                    data = { status: "error", message: job.error };
+                    break;
+                }
+                await new Promise((r) => setTimeout(r, 2000));
+                const poll = await fetch(`http://localhost:8000/jobs/${data.job_id}`);
+                data = { ...(await poll.json()), job_id: data.job_id };
+            }
 
             if (data.status === "success") {
                 setTrainMessage("Modelo entrenado correctamente 🎉");